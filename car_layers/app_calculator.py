@@ -4,45 +4,156 @@ conforme Lei 12.651/2012 (Código Florestal).
 """
 import geopandas as gpd
 import numpy as np
-from shapely.geometry import Polygon, Point, LineString, MultiPolygon
-from shapely.ops import unary_union
+import pandas as pd
+import shapely
+from shapely.geometry import Polygon, Point, LineString, MultiPolygon, shape
 import logging
+import math
 from pathlib import Path
 from typing import Optional
 
+try:
+    from numba import njit, prange
+except ImportError:  # numba é opcional; sem ele usa-se numexpr ou NumPy
+    njit = None
+
+try:
+    import numexpr
+except ImportError:  # numexpr é opcional
+    numexpr = None
+
 import sys
-sys.path.insert(0, str(Path(__file__).parent.parent))
+_PROJECT_ROOT = str(Path(__file__).parent.parent)
+if _PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, _PROJECT_ROOT)
 from config import (
     APP_MARGEM, APP_NASCENTE_RAIO_M, APP_LAGO_PEQUENO_M,
     APP_LAGO_GRANDE_M, APP_DECLIVIDADE_GRAUS, UTM_CRS_SP,
     DEFAULT_CRS
 )
+from geospatial.projection import transform_geometry
 
 logger = logging.getLogger(__name__)
 
+# Largura assumida para rios sem largura informada
+_LARGURA_PADRAO_M = 5.0
+
+# Tabela APP_MARGEM em arrays ordenados para busca binária vetorizada:
+# larguras finitas e buffers correspondentes (último = rios >600m)
+_MARGEM_WIDTHS = np.array(sorted(k for k in APP_MARGEM if np.isfinite(k)))
+_MARGEM_BUFFERS = np.array(
+    [APP_MARGEM[k] for k in _MARGEM_WIDTHS] + [APP_MARGEM[float('inf')]]
+)
+
+
+# Tamanho (pixels) dos blocos de leitura do DEM na APP de declividade
+_DEM_TILE_SIZE = 512
+
+# Modelo de GeoDataFrame de APP vazio, copiado em vez de reconstruído
+_EMPTY_APP_GDF = gpd.GeoDataFrame({
+    'geometry': gpd.GeoSeries([], crs=DEFAULT_CRS),
+    'cod_app': pd.Series([], dtype='object'),
+    'tip_app': pd.Series([], dtype='object'),
+    'des_condic': pd.Series([], dtype='object'),
+    'num_area': pd.Series([], dtype='float64')
+}, crs=DEFAULT_CRS)
+
+
+def _slope_mask_numpy(dem, res_x, res_y, limite_graus):
+    """Máscara uint8 de declividade > limite_graus (implementação NumPy)."""
+    dy, dx = np.gradient(dem, res_y, res_x)
+    slope_deg = np.degrees(np.arctan(np.sqrt(dx**2 + dy**2)))
+    return (slope_deg > limite_graus).astype(np.uint8)
+
+
+if njit is not None:
+    @njit(parallel=True, cache=True)
+    def _slope_mask_numba(dem, res_x, res_y, limite_graus):
+        """
+        Gradiente, declividade e limiar em uma única passada sobre o DEM.
+
+        Usa as mesmas diferenças de np.gradient (centrais no interior,
+        unilaterais nas bordas), sem alocar arrays intermediários.
+        """
+        n_rows, n_cols = dem.shape
+        out = np.zeros((n_rows, n_cols), dtype=np.uint8)
+        for i in prange(n_rows):
+            i0 = max(i - 1, 0)
+            i1 = min(i + 1, n_rows - 1)
+            for j in range(n_cols):
+                j0 = max(j - 1, 0)
+                j1 = min(j + 1, n_cols - 1)
+                dy = (dem[i1, j] - dem[i0, j]) / ((i1 - i0) * res_y)
+                dx = (dem[i, j1] - dem[i, j0]) / ((j1 - j0) * res_x)
+                slope = math.degrees(math.atan(math.sqrt(dx * dx + dy * dy)))
+                if slope > limite_graus:
+                    out[i, j] = 1
+        return out
+
+
+def _slope_mask_numexpr(dem, res_x, res_y, limite_graus):
+    """Máscara uint8 de declividade com magnitude/arctan/limiar fundidos em numexpr."""
+    dy, dx = np.gradient(dem, res_y, res_x)
+    steep = numexpr.evaluate(
+        'arctan(sqrt(dx*dx + dy*dy)) * graus_por_rad > limite',
+        local_dict={
+            'dx': dx,
+            'dy': dy,
+            'graus_por_rad': 180.0 / np.pi,
+            'limite': float(limite_graus)
+        }
+    )
+    return steep.view(np.uint8)
+
+
+def _slope_mask(dem, res_x, res_y, limite_graus):
+    """
+    Máscara uint8 (1 = declividade acima de limite_graus) do DEM.
+
+    Usa Numba se instalado, senão numexpr, senão NumPy puro.
+    """
+    dem = np.asarray(dem, dtype=np.float64)
+    if min(dem.shape) < 2:
+        return _slope_mask_numpy(dem, res_x, res_y, limite_graus)
+    if njit is not None:
+        return _slope_mask_numba(dem, float(res_x), float(res_y), float(limite_graus))
+    if numexpr is not None:
+        return _slope_mask_numexpr(dem, res_x, res_y, limite_graus)
+    return _slope_mask_numpy(dem, res_x, res_y, limite_graus)
+
 
 class APPCalculator:
     """Calculadora de APP para imóvel rural."""
 
-    def __init__(self, perimeter: Polygon, dem_path: str = None):
+    def __init__(
+        self,
+        perimeter: Polygon,
+        dem_path: str = None,
+        perimeter_utm: Polygon = None
+    ):
         """
         Args:
             perimeter: Polígono do perímetro do imóvel
             dem_path: Caminho para o DEM (TOPODATA) - opcional
+            perimeter_utm: Perímetro já reprojetado para UTM_CRS_SP -
+                opcional, evita nova reprojeção
         """
         self.perimeter = perimeter
         self.dem_path = dem_path
         self._perimeter_utm = None
+        if perimeter_utm is not None:
+            self._perimeter_utm = perimeter_utm
+            shapely.prepare(self._perimeter_utm)
 
     @property
     def perimeter_utm(self):
         """Perímetro em UTM para cálculos em metros."""
         if self._perimeter_utm is None:
-            gdf = gpd.GeoDataFrame(
-                {'geometry': [self.perimeter]},
-                crs=DEFAULT_CRS
+            self._perimeter_utm = transform_geometry(
+                self.perimeter, DEFAULT_CRS, UTM_CRS_SP
             )
-            self._perimeter_utm = gdf.to_crs(UTM_CRS_SP).geometry.iloc[0]
+            # Preparar o perímetro acelera os testes de interseção repetidos
+            shapely.prepare(self._perimeter_utm)
         return self._perimeter_utm
 
     def calculate_all_apps(
@@ -64,25 +175,27 @@ class APPCalculator:
         """
         logger.info("Iniciando cálculo de APPs")
 
-        all_apps = []
+        # APPs vetoriais são calculadas em UTM e reprojetadas juntas
+        apps_utm = []
 
         # 1. APP de margem de rio
         if rivers_gdf is not None and not rivers_gdf.empty:
-            app_margem = self.calculate_app_margem(rivers_gdf)
-            if not app_margem.empty:
-                all_apps.append(app_margem)
+            apps_utm.append(self._app_margem_utm(rivers_gdf))
 
         # 2. APP de nascente
         if nascentes_gdf is not None and not nascentes_gdf.empty:
-            app_nascente = self.calculate_app_nascente(nascentes_gdf)
-            if not app_nascente.empty:
-                all_apps.append(app_nascente)
+            apps_utm.append(self._app_nascente_utm(nascentes_gdf))
 
         # 3. APP de lago
         if lagos_gdf is not None and not lagos_gdf.empty:
-            app_lago = self.calculate_app_lago(lagos_gdf)
-            if not app_lago.empty:
-                all_apps.append(app_lago)
+            apps_utm.append(self._app_lago_utm(lagos_gdf))
+
+        apps_utm = [gdf for gdf in apps_utm if gdf is not None]
+        all_apps = []
+        if apps_utm:
+            all_apps.append(
+                self._apps_to_wgs84(pd.concat(apps_utm, ignore_index=True))
+            )
 
         # 4. APP de declividade (se DEM disponível)
         if self.dem_path:
@@ -92,10 +205,8 @@ class APPCalculator:
 
         # Consolidar todas as APPs
         if all_apps:
-            result = gpd.GeoDataFrame(
-                pd.concat(all_apps, ignore_index=True),
-                crs=DEFAULT_CRS
-            )
+            # concat de GeoDataFrames já devolve GeoDataFrame com o CRS
+            result = pd.concat(all_apps, ignore_index=True)
             logger.info(f"Total de APPs calculadas: {len(result)} polígonos")
             return result
 
@@ -107,134 +218,156 @@ class APPCalculator:
         rivers_gdf: gpd.GeoDataFrame
     ) -> gpd.GeoDataFrame:
         """Calcula APP de margem de curso d'água."""
-        logger.info(f"Calculando APP de margem para {len(rivers_gdf)} cursos d'água")
-
-        apps = []
-        rivers_utm = rivers_gdf.to_crs(UTM_CRS_SP)
-
-        for idx, row in rivers_utm.iterrows():
-            river = row.geometry
-            largura = row.get('largura_m', 5) if hasattr(row, 'get') else row['largura_m'] if 'largura_m' in rivers_gdf.columns else 5
-
-            # Determinar faixa de APP baseado na largura
-            buffer_m = self._get_buffer_by_width(largura)
-
-            # Criar buffer ao redor do rio (APP)
-            app_buffer = river.buffer(buffer_m)
+        return self._apps_to_wgs84(self._app_margem_utm(rivers_gdf))
 
-            # Verificar se o buffer do rio (APP) intersecta o perímetro
-            # A APP conta mesmo que o rio esteja fora, desde que a faixa de proteção entre no imóvel
-            app_dentro = app_buffer.intersection(self.perimeter_utm)
+    def _app_margem_utm(
+        self,
+        rivers_gdf: gpd.GeoDataFrame
+    ) -> Optional[gpd.GeoDataFrame]:
+        """APP de margem em UTM (None se nenhuma APP for criada)."""
+        logger.info(f"Calculando APP de margem para {len(rivers_gdf)} cursos d'água")
 
-            # Log para debug
-            dist_to_perimeter = river.distance(self.perimeter_utm)
-            logger.debug(f"Rio {idx}: largura={largura}m, buffer={buffer_m}m, dist_ao_perimetro={dist_to_perimeter:.1f}m, intersecção_vazia={app_dentro.is_empty}")
+        rivers_utm = self._to_utm(rivers_gdf)
 
-            if not app_dentro.is_empty:
-                app_wgs84 = self._utm_to_wgs84(app_dentro)
-                area_ha = app_dentro.area / 10000
+        # Só rios a até a maior faixa de APP do perímetro podem gerar APP
+        candidatos = self._near_perimeter(rivers_utm, _MARGEM_BUFFERS.max())
 
-                apps.append({
-                    'geometry': app_wgs84,
-                    'cod_app': f'APP_MARGEM_{idx+1:03d}',
-                    'tip_app': 'MARGEM_CURSO_DAGUA',
-                    'des_condic': 'A_CLASSIFICAR',
-                    'num_area': round(area_ha, 4),
-                    'buffer_m': buffer_m,
-                    'largura_rio_m': largura
-                })
+        # Largura de todos os rios resolvida de uma vez; ausente ou não
+        # numérica assume o padrão conservador
+        if 'largura_m' in candidatos.columns:
+            larguras = pd.to_numeric(
+                candidatos['largura_m'], errors='coerce'
+            ).fillna(_LARGURA_PADRAO_M).to_numpy(dtype=float)
+        else:
+            larguras = np.full(len(candidatos), _LARGURA_PADRAO_M)
+
+        # Determinar faixa de APP baseado na largura
+        buffers_m = _MARGEM_BUFFERS[
+            np.searchsorted(_MARGEM_WIDTHS, larguras, side='left')
+        ]
+
+        # Buffer ao redor de todos os rios (APP) em uma única chamada GEOS.
+        # A APP conta mesmo que o rio esteja fora, desde que a faixa de
+        # proteção entre no imóvel (quad_segs=16 é o padrão de Geometry.buffer)
+        app_buffers = shapely.buffer(
+            candidatos.geometry.values, buffers_m, quad_segs=16
+        )
+        app_dentro, areas_ha, mask = self._clip_to_perimeter(app_buffers)
+
+        logger.debug(f"Rios com APP dentro do perímetro: {int(mask.sum())}/{len(mask)}")
+
+        if mask.any():
+            apps = self._build_app_gdf(
+                geometry=app_dentro,
+                areas_ha=areas_ha,
+                idx=candidatos.index[mask],
+                cod_prefix='APP_MARGEM',
+                tip_app='MARGEM_CURSO_DAGUA',
+                buffer_m=buffers_m[mask],
+                largura_rio_m=larguras[mask]
+            )
 
-        if apps:
             logger.info(f"APPs de margem criadas: {len(apps)}")
-            return gpd.GeoDataFrame(apps, crs=DEFAULT_CRS)
+            return apps
 
         # Se não criou APPs, informar a distância mínima encontrada
         if rivers_utm is not None and len(rivers_utm) > 0:
-            min_dist = min(r.geometry.distance(self.perimeter_utm) for _, r in rivers_utm.iterrows())
+            min_dist = float(np.nanmin(
+                shapely.distance(rivers_utm.geometry.values, self.perimeter_utm)
+            ))
             logger.info(f"Nenhuma APP de margem criada - curso d'água mais próximo está a {min_dist:.0f}m do perímetro")
         else:
             logger.info("Nenhuma APP de margem criada - nenhum curso d'água encontrado")
 
-        return self._empty_app_gdf()
+        return None
 
     def calculate_app_nascente(
         self,
         nascentes_gdf: gpd.GeoDataFrame
     ) -> gpd.GeoDataFrame:
         """Calcula APP de nascente (50m de raio)."""
-        logger.info("Calculando APP de nascente")
-
-        apps = []
-        nascentes_utm = nascentes_gdf.to_crs(UTM_CRS_SP)
-
-        for idx, row in nascentes_utm.iterrows():
-            nascente = row.geometry
+        return self._apps_to_wgs84(self._app_nascente_utm(nascentes_gdf))
 
-            # Buffer de 50m
-            app_buffer = nascente.buffer(APP_NASCENTE_RAIO_M)
-
-            # Intersectar com perímetro
-            app_dentro = app_buffer.intersection(self.perimeter_utm)
-
-            if not app_dentro.is_empty:
-                app_wgs84 = self._utm_to_wgs84(app_dentro)
-                area_ha = app_dentro.area / 10000
-
-                apps.append({
-                    'geometry': app_wgs84,
-                    'cod_app': f'APP_NASC_{idx+1:03d}',
-                    'tip_app': 'NASCENTE',
-                    'des_condic': 'A_CLASSIFICAR',
-                    'num_area': round(area_ha, 4),
-                    'buffer_m': APP_NASCENTE_RAIO_M
-                })
+    def _app_nascente_utm(
+        self,
+        nascentes_gdf: gpd.GeoDataFrame
+    ) -> Optional[gpd.GeoDataFrame]:
+        """APP de nascente em UTM (None se nenhuma APP for criada)."""
+        logger.info("Calculando APP de nascente")
 
-        if apps:
-            return gpd.GeoDataFrame(apps, crs=DEFAULT_CRS)
+        nascentes_utm = self._near_perimeter(
+            self._to_utm(nascentes_gdf), APP_NASCENTE_RAIO_M
+        )
+
+        # Buffer de 50m intersectado com o perímetro
+        app_buffers = shapely.buffer(
+            nascentes_utm.geometry.values, APP_NASCENTE_RAIO_M, quad_segs=16
+        )
+        app_dentro, areas_ha, mask = self._clip_to_perimeter(app_buffers)
+
+        if mask.any():
+            return self._build_app_gdf(
+                geometry=app_dentro,
+                areas_ha=areas_ha,
+                idx=nascentes_utm.index[mask],
+                cod_prefix='APP_NASC',
+                tip_app='NASCENTE',
+                buffer_m=np.full(len(app_dentro), APP_NASCENTE_RAIO_M)
+            )
 
-        return self._empty_app_gdf()
+        return None
 
     def calculate_app_lago(
         self,
         lagos_gdf: gpd.GeoDataFrame
     ) -> gpd.GeoDataFrame:
         """Calcula APP de lagos e lagoas naturais."""
-        logger.info("Calculando APP de lagos")
-
-        apps = []
-        lagos_utm = lagos_gdf.to_crs(UTM_CRS_SP)
-
-        for idx, row in lagos_utm.iterrows():
-            lago = row.geometry
-            area_ha = row.get('area_ha', lago.area / 10000)
-
-            # Determinar buffer baseado no tamanho
-            buffer_m = APP_LAGO_GRANDE_M if area_ha > 20 else APP_LAGO_PEQUENO_M
-
-            # Buffer a partir da borda do lago (excluindo o próprio lago)
-            app_buffer = lago.buffer(buffer_m).difference(lago)
-
-            # Intersectar com perímetro
-            app_dentro = app_buffer.intersection(self.perimeter_utm)
-
-            if not app_dentro.is_empty:
-                app_wgs84 = self._utm_to_wgs84(app_dentro)
-                app_area_ha = app_dentro.area / 10000
+        return self._apps_to_wgs84(self._app_lago_utm(lagos_gdf))
 
-                apps.append({
-                    'geometry': app_wgs84,
-                    'cod_app': f'APP_LAGO_{idx+1:03d}',
-                    'tip_app': 'LAGO_LAGOA',
-                    'des_condic': 'A_CLASSIFICAR',
-                    'num_area': round(app_area_ha, 4),
-                    'buffer_m': buffer_m,
-                    'area_lago_ha': area_ha
-                })
+    def _app_lago_utm(
+        self,
+        lagos_gdf: gpd.GeoDataFrame
+    ) -> Optional[gpd.GeoDataFrame]:
+        """APP de lagos em UTM (None se nenhuma APP for criada)."""
+        logger.info("Calculando APP de lagos")
 
-        if apps:
-            return gpd.GeoDataFrame(apps, crs=DEFAULT_CRS)
+        lagos_utm = self._near_perimeter(
+            self._to_utm(lagos_gdf),
+            max(APP_LAGO_GRANDE_M, APP_LAGO_PEQUENO_M)
+        )
+        lagos = np.asarray(lagos_utm.geometry.values)
+
+        areas_lago_ha = shapely.area(lagos) / 10000
+        if 'area_ha' in lagos_utm.columns:
+            areas_lago_ha = lagos_utm['area_ha'].fillna(
+                pd.Series(areas_lago_ha, index=lagos_utm.index)
+            ).to_numpy(dtype=float)
+
+        # Determinar buffer baseado no tamanho
+        buffers_m = np.where(areas_lago_ha > 20, APP_LAGO_GRANDE_M, APP_LAGO_PEQUENO_M)
+
+        # Buffer a partir da borda do lago (excluindo o próprio lago). Se o
+        # lago não toca o perímetro, o recorte já exclui o espelho d'água e
+        # a diferença pode ser omitida
+        app_buffers = shapely.buffer(lagos, buffers_m, quad_segs=16)
+        toca = shapely.intersects(lagos, self.perimeter_utm)
+        app_buffers[toca] = shapely.difference(app_buffers[toca], lagos[toca])
+
+        # Intersectar com perímetro
+        app_dentro, areas_ha, mask = self._clip_to_perimeter(app_buffers)
+
+        if mask.any():
+            return self._build_app_gdf(
+                geometry=app_dentro,
+                areas_ha=areas_ha,
+                idx=lagos_utm.index[mask],
+                cod_prefix='APP_LAGO',
+                tip_app='LAGO_LAGOA',
+                buffer_m=buffers_m[mask],
+                area_lago_ha=areas_lago_ha[mask]
+            )
 
-        return self._empty_app_gdf()
+        return None
 
     def calculate_app_declividade(self) -> Optional[gpd.GeoDataFrame]:
         """Calcula APP de declividade >45°."""
@@ -246,59 +379,33 @@ class APPCalculator:
 
         try:
             import rasterio
-            from rasterio.mask import mask as rio_mask
 
             with rasterio.open(self.dem_path) as src:
-                # Recortar DEM pelo perímetro
-                perimeter_geojson = [self.perimeter.__geo_interface__]
-                dem_clip, transform = rio_mask(
-                    src, perimeter_geojson, crop=True
-                )
-                dem_data = dem_clip[0]
-
-                # Calcular declividade (slope)
-                dy, dx = np.gradient(dem_data, src.res[1], src.res[0])
-                slope_rad = np.arctan(np.sqrt(dx**2 + dy**2))
-                slope_deg = np.degrees(slope_rad)
-
-                # Criar máscara de áreas >45°
-                steep_mask = slope_deg > APP_DECLIVIDADE_GRAUS
-
-                if np.any(steep_mask):
-                    from rasterio.features import shapes
-
-                    steep_shapes = list(shapes(
-                        steep_mask.astype(np.uint8),
-                        mask=steep_mask,
-                        transform=transform
-                    ))
-
-                    apps = []
-                    for i, (geom, value) in enumerate(steep_shapes):
-                        if value == 1:
-                            poly = Polygon(geom['coordinates'][0])
-                            poly_wgs84 = gpd.GeoSeries(
-                                [poly], crs=src.crs
-                            ).to_crs(DEFAULT_CRS).iloc[0]
-
-                            # Intersectar com perímetro
-                            app_dentro = poly_wgs84.intersection(self.perimeter)
-
-                            if not app_dentro.is_empty:
-                                area_ha = gpd.GeoSeries(
-                                    [app_dentro], crs=DEFAULT_CRS
-                                ).to_crs(UTM_CRS_SP).iloc[0].area / 10000
-
-                                apps.append({
-                                    'geometry': app_dentro,
-                                    'cod_app': f'APP_DECLIV_{i+1:03d}',
-                                    'tip_app': 'DECLIVIDADE_SUPERIOR_45',
-                                    'des_condic': 'A_CLASSIFICAR',
-                                    'num_area': round(area_ha, 4)
-                                })
-
-                    if apps:
-                        return gpd.GeoDataFrame(apps, crs=DEFAULT_CRS)
+                polys = self._steep_polygons(src)
+
+                if len(polys):
+                    # DEM TOPODATA já vem em coordenadas geográficas na
+                    # maioria dos casos; nesse caso a reprojeção é omitida
+                    polys_wgs84 = transform_geometry(
+                        polys, src.crs.to_string(), DEFAULT_CRS
+                    )
+
+                    # Intersectar com perímetro
+                    app_dentro = shapely.intersection(polys_wgs84, self.perimeter)
+                    areas_ha = shapely.area(
+                        transform_geometry(app_dentro, DEFAULT_CRS, UTM_CRS_SP)
+                    ) / 10000
+                    mask = areas_ha > 0
+
+                    if mask.any():
+                        return self._build_app_gdf(
+                            geometry=app_dentro[mask],
+                            crs=DEFAULT_CRS,
+                            areas_ha=areas_ha[mask],
+                            idx=np.flatnonzero(mask),
+                            cod_prefix='APP_DECLIV',
+                            tip_app='DECLIVIDADE_SUPERIOR_45'
+                        )
 
                 logger.info("Nenhuma área com declividade >45° encontrada")
 
@@ -309,28 +416,157 @@ class APPCalculator:
 
         return None
 
+    def _steep_polygons(self, src) -> np.ndarray:
+        """
+        Polígonos (no CRS do DEM) com declividade >45° sob o perímetro.
+
+        O DEM é lido em blocos de _DEM_TILE_SIZE pixels com 1 pixel de
+        borda extra, de modo que o gradiente de cada bloco é o mesmo do
+        raster inteiro. Polígonos cortados na divisa entre blocos são
+        unidos ao final.
+        """
+        from rasterio.features import shapes
+        from rasterio.windows import Window, from_bounds
+        from rasterio.windows import transform as window_transform
+
+        # Janela do DEM que cobre o perímetro
+        bounds = transform_geometry(
+            self.perimeter, DEFAULT_CRS, src.crs.to_string()
+        ).bounds
+        win = from_bounds(*bounds, transform=src.transform)
+        row0 = max(int(math.floor(win.row_off)), 0)
+        col0 = max(int(math.floor(win.col_off)), 0)
+        row1 = min(int(math.ceil(win.row_off + win.height)), src.height)
+        col1 = min(int(math.ceil(win.col_off + win.width)), src.width)
+
+        polys = []
+        n_tiles = 0
+        for r in range(row0, row1, _DEM_TILE_SIZE):
+            for c in range(col0, col1, _DEM_TILE_SIZE):
+                h = min(_DEM_TILE_SIZE, row1 - r)
+                w = min(_DEM_TILE_SIZE, col1 - c)
+
+                # Bloco com borda de 1 pixel (limitada ao raster)
+                hr0, hc0 = max(r - 1, 0), max(c - 1, 0)
+                hr1, hc1 = min(r + h + 1, src.height), min(c + w + 1, src.width)
+                dem = src.read(
+                    1, window=Window(hc0, hr0, hc1 - hc0, hr1 - hr0)
+                ).astype(np.float64)
+                if src.nodata is not None:
+                    dem[dem == src.nodata] = np.nan
+
+                steep = _slope_mask(
+                    dem, src.res[0], src.res[1], APP_DECLIVIDADE_GRAUS
+                )[r - hr0:r - hr0 + h, c - hc0:c - hc0 + w]
+                n_tiles += 1
+
+                if steep.any():
+                    tile_transform = window_transform(
+                        Window(c, r, w, h), src.transform
+                    )
+                    polys.extend(
+                        shape(geom) for geom, value in shapes(
+                            steep, mask=steep.astype(bool), transform=tile_transform
+                        ) if value == 1
+                    )
+
+        polys = np.array(polys, dtype=object)
+        if n_tiles > 1 and len(polys) > 1:
+            polys = shapely.get_parts(shapely.union_all(polys))
+        return polys
+
+    def _near_perimeter(
+        self,
+        gdf_utm: gpd.GeoDataFrame,
+        distance_m: float
+    ) -> gpd.GeoDataFrame:
+        """Filtra feições a até distance_m do perímetro via STRtree."""
+        tree = shapely.STRtree(gdf_utm.geometry.values)
+        candidate_idx = tree.query(
+            self.perimeter_utm, predicate='dwithin', distance=distance_m
+        )
+        return gdf_utm.iloc[np.sort(candidate_idx)]
+
+    def _clip_to_perimeter(self, geometries):
+        """
+        Recorta geometrias UTM pelo perímetro.
+
+        O perímetro preparado descarta rapidamente as geometrias que não
+        o tocam, e a interseção só é calculada para as demais.
+
+        Returns:
+            Tuple com (recortes com área dentro do perímetro, área de cada
+            recorte em hectares, máscara booleana das geometrias mantidas)
+        """
+        mask = shapely.intersects(geometries, self.perimeter_utm)
+        recortes = shapely.intersection(geometries[mask], self.perimeter_utm)
+        areas_ha = shapely.area(recortes) / 10000
+
+        # Interseções que só tocam a divisa não têm área e não geram APP
+        keep = areas_ha > 0
+        mask[mask] = keep
+        return recortes[keep], areas_ha[keep], mask
+
     def _get_buffer_by_width(self, width_m: float) -> float:
         """Retorna largura do buffer APP baseado na largura do rio."""
-        for max_width, buffer in sorted(APP_MARGEM.items()):
-            if width_m <= max_width:
-                return buffer
-        return 500  # Máximo para rios >600m
+        return float(_MARGEM_BUFFERS[np.searchsorted(_MARGEM_WIDTHS, width_m, side='left')])
+
+    def _to_utm(self, gdf: gpd.GeoDataFrame) -> gpd.GeoDataFrame:
+        """Reprojeta uma camada para UTM com o Transformer em cache."""
+        return gdf.set_geometry(
+            transform_geometry(
+                np.asarray(gdf.geometry.values), gdf.crs.to_string(), UTM_CRS_SP
+            ),
+            crs=UTM_CRS_SP
+        )
+
+    def _apps_to_wgs84(
+        self,
+        apps_utm: Optional[gpd.GeoDataFrame]
+    ) -> gpd.GeoDataFrame:
+        """Reprojeta APPs calculadas em UTM para WGS84 em uma única chamada."""
+        if apps_utm is None:
+            return self._empty_app_gdf()
+
+        return apps_utm.set_geometry(
+            transform_geometry(
+                np.asarray(apps_utm.geometry.values), UTM_CRS_SP, DEFAULT_CRS
+            ),
+            crs=DEFAULT_CRS
+        )
+
+    def _build_app_gdf(
+        self,
+        geometry: np.ndarray,
+        areas_ha: np.ndarray,
+        idx,
+        cod_prefix: str,
+        tip_app: str,
+        crs: str = UTM_CRS_SP,
+        **extra_columns
+    ) -> gpd.GeoDataFrame:
+        """
+        Monta o GeoDataFrame de APPs a partir de uma coluna por atributo.
 
-    def _utm_to_wgs84(self, geometry):
-        """Converte geometria de UTM para WGS84."""
-        gdf = gpd.GeoDataFrame({'geometry': [geometry]}, crs=UTM_CRS_SP)
-        return gdf.to_crs(DEFAULT_CRS).geometry.iloc[0]
+        Args:
+            geometry: Geometrias das APPs
+            areas_ha: Área de cada APP em hectares
+            idx: Índice da feição de origem (numeração do cod_app)
+            cod_prefix: Prefixo do cod_app (ex: 'APP_MARGEM')
+            tip_app: Tipo de APP
+            crs: CRS das geometrias (default: UTM)
+            **extra_columns: Colunas adicionais (arrays do mesmo tamanho)
+        """
+        n = len(geometry)
+        numeros = (np.asarray(idx, dtype=np.int64) + 1).astype(str)
+        return gpd.GeoDataFrame({
+            'cod_app': np.char.add(f'{cod_prefix}_', np.char.zfill(numeros, 3)),
+            'tip_app': np.full(n, tip_app, dtype=object),
+            'des_condic': np.full(n, 'A_CLASSIFICAR', dtype=object),
+            'num_area': np.round(areas_ha, 4),
+            **extra_columns
+        }, geometry=geometry, crs=crs)
 
     def _empty_app_gdf(self) -> gpd.GeoDataFrame:
         """Retorna GeoDataFrame vazio com schema correto."""
-        return gpd.GeoDataFrame({
-            'geometry': [],
-            'cod_app': [],
-            'tip_app': [],
-            'des_condic': [],
-            'num_area': []
-        }, crs=DEFAULT_CRS)
-
-
-# Importação necessária para concatenação
-import pandas as pd
+        return _EMPTY_APP_GDF.copy()
@@ -2,6 +2,8 @@
 Cálculo e sugestão de localização da Reserva Legal.
 """
 import geopandas as gpd
+import numpy as np
+import shapely
 from shapely.geometry import Polygon, MultiPolygon
 from shapely.ops import unary_union
 import logging
@@ -9,35 +11,65 @@ from pathlib import Path
 from typing import Optional
 
 import sys
-sys.path.insert(0, str(Path(__file__).parent.parent))
+_PROJECT_ROOT = str(Path(__file__).parent.parent)
+if _PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, _PROJECT_ROOT)
 from config import RESERVA_LEGAL_PERCENT, UTM_CRS_SP, DEFAULT_CRS
+from geospatial._geo_utils import largest_polygon
+from geospatial.projection import transform_geometry
 
 logger = logging.getLogger(__name__)
 
+# Buffers (m) testados ao buscar área contígua à APP, em ordem crescente
+_APP_BUFFER_SIZES = [50, 100, 200, 500, 1000, 2000]
+
+
+def _union_near(geoms: np.ndarray, area, distance: float = 0.0):
+    """
+    União apenas das geometrias a até `distance` de `area`.
+
+    O STRtree descarta as feições distantes antes da união; retorna None
+    se nenhuma estiver próxima.
+    """
+    tree = shapely.STRtree(geoms)
+    if distance > 0:
+        idx = tree.query(area, predicate='dwithin', distance=distance)
+    else:
+        idx = tree.query(area, predicate='intersects')
+
+    if len(idx) == 0:
+        return None
+    return unary_union(geoms[np.sort(idx)])
+
 
 class ReservaLegalCalculator:
     """Calculadora de Reserva Legal."""
 
-    def __init__(self, perimeter: Polygon, bioma: str = 'MATA_ATLANTICA'):
+    def __init__(
+        self,
+        perimeter: Polygon,
+        bioma: str = 'MATA_ATLANTICA',
+        perimeter_utm: Polygon = None
+    ):
         """
         Args:
             perimeter: Polígono do perímetro do imóvel
             bioma: Bioma do imóvel (MATA_ATLANTICA, CERRADO, AMAZONIA)
+            perimeter_utm: Perímetro já reprojetado para UTM_CRS_SP -
+                opcional, evita nova reprojeção
         """
         self.perimeter = perimeter
         self.bioma = bioma
         self.percent = RESERVA_LEGAL_PERCENT.get(bioma, 0.20)
-        self._perimeter_utm = None
+        self._perimeter_utm = perimeter_utm
 
     @property
     def perimeter_utm(self):
         """Perímetro em UTM para cálculos em metros."""
         if self._perimeter_utm is None:
-            gdf = gpd.GeoDataFrame(
-                {'geometry': [self.perimeter]},
-                crs=DEFAULT_CRS
+            self._perimeter_utm = transform_geometry(
+                self.perimeter, DEFAULT_CRS, UTM_CRS_SP
             )
-            self._perimeter_utm = gdf.to_crs(UTM_CRS_SP).geometry.iloc[0]
         return self._perimeter_utm
 
     def calculate_required_area(self) -> float:
@@ -80,14 +112,24 @@ class ReservaLegalCalculator:
         required_ha = self.calculate_required_area()
         required_m2 = required_ha * 10000
 
+        # União das APPs em UTM, calculada uma única vez. Só interessam
+        # APPs a até o maior buffer de contiguidade do perímetro
+        app_union = None
+        if app_gdf is not None and not app_gdf.empty:
+            app_union = _union_near(
+                self._geometries_utm(app_gdf),
+                self.perimeter_utm,
+                distance=_APP_BUFFER_SIZES[-1]
+            )
+
         # Área disponível = Perímetro - APP
-        disponivel = self._calculate_available_area(app_gdf)
+        disponivel = self._calculate_available_area(app_union)
 
         # Determinar geometria da RL
         rl_geometry = self._select_rl_area(
             disponivel=disponivel,
             required_m2=required_m2,
-            app_gdf=app_gdf,
+            app_union=app_union,
             vegetacao_nativa_gdf=vegetacao_nativa_gdf
         )
 
@@ -113,21 +155,16 @@ class ReservaLegalCalculator:
 
         return gdf
 
-    def _calculate_available_area(
-        self,
-        app_gdf: gpd.GeoDataFrame = None
-    ) -> Polygon:
+    def _calculate_available_area(self, app_union=None) -> Polygon:
         """Calcula área disponível (perímetro - APP)."""
         disponivel = self.perimeter_utm
 
-        if app_gdf is not None and not app_gdf.empty:
-            app_utm = app_gdf.to_crs(UTM_CRS_SP)
-            app_union = unary_union(app_utm.geometry)
+        if app_union is not None:
             disponivel = self.perimeter_utm.difference(app_union)
 
             # Garantir que é Polygon
             if isinstance(disponivel, MultiPolygon):
-                disponivel = max(disponivel.geoms, key=lambda p: p.area)
+                disponivel = largest_polygon(disponivel)
 
         return disponivel
 
@@ -135,7 +172,7 @@ class ReservaLegalCalculator:
         self,
         disponivel: Polygon,
         required_m2: float,
-        app_gdf: gpd.GeoDataFrame = None,
+        app_union=None,
         vegetacao_nativa_gdf: gpd.GeoDataFrame = None
     ) -> Polygon:
         """
@@ -143,11 +180,15 @@ class ReservaLegalCalculator:
         """
         # Prioridade 1: Vegetação nativa existente
         if vegetacao_nativa_gdf is not None and not vegetacao_nativa_gdf.empty:
-            veg_utm = vegetacao_nativa_gdf.to_crs(UTM_CRS_SP)
-            veg_union = unary_union(veg_utm.geometry)
+            veg_union = _union_near(
+                self._geometries_utm(vegetacao_nativa_gdf), disponivel
+            )
 
             # Interseção com área disponível
-            veg_disponivel = veg_union.intersection(disponivel)
+            veg_disponivel = (
+                veg_union.intersection(disponivel)
+                if veg_union is not None else Polygon()
+            )
 
             if not veg_disponivel.is_empty:
                 veg_area = veg_disponivel.area
@@ -161,35 +202,42 @@ class ReservaLegalCalculator:
                     logger.info("Complementando RL com área contígua à APP")
                     complemento = self._select_contigua_app(
                         disponivel=disponivel.difference(veg_disponivel),
-                        app_gdf=app_gdf,
+                        app_union=app_union,
                         required_m2=required_m2 - veg_area
                     )
                     return unary_union([veg_disponivel, complemento])
 
         # Prioridade 2: Área contígua à APP
-        return self._select_contigua_app(disponivel, app_gdf, required_m2)
+        return self._select_contigua_app(disponivel, app_union, required_m2)
 
     def _select_contigua_app(
         self,
         disponivel: Polygon,
-        app_gdf: gpd.GeoDataFrame,
+        app_union,
         required_m2: float
     ) -> Polygon:
         """Seleciona área contígua à APP para RL."""
-        if app_gdf is None or app_gdf.empty:
+        if app_union is None:
             # Sem APP, usar qualquer área disponível
             return self._extract_area(disponivel, required_m2)
 
-        app_utm = app_gdf.to_crs(UTM_CRS_SP)
-        app_union = unary_union(app_utm.geometry)
-
-        # Criar buffer progressivo até atingir área necessária
-        for buffer_size in [50, 100, 200, 500, 1000, 2000]:
-            app_buffer = app_union.buffer(buffer_size)
-            area_contigua = app_buffer.intersection(disponivel)
+        # Menor buffer que atinge a área necessária. A área contígua só
+        # cresce com o buffer, então uma busca binária basta
+        buffer_sizes = _APP_BUFFER_SIZES
+        lo, hi = 0, len(buffer_sizes)
+        melhor = None
+        while lo < hi:
+            mid = (lo + hi) // 2
+            area_contigua = app_union.buffer(buffer_sizes[mid]).intersection(disponivel)
 
             if area_contigua.area >= required_m2:
-                return self._extract_area(area_contigua, required_m2)
+                melhor = area_contigua
+                hi = mid
+            else:
+                lo = mid + 1
+
+        if melhor is not None:
+            return self._extract_area(melhor, required_m2)
 
         # Se não encontrou área suficiente, retornar toda área disponível
         logger.warning("Não foi possível encontrar área suficiente contígua à APP")
@@ -210,10 +258,15 @@ class ReservaLegalCalculator:
         # de particionamento para extrair área exata
         return geometry
 
+    def _geometries_utm(self, gdf: gpd.GeoDataFrame):
+        """Reprojeta apenas a coluna de geometria para UTM (sem copiar atributos)."""
+        return transform_geometry(
+            np.asarray(gdf.geometry.values), gdf.crs.to_string(), UTM_CRS_SP
+        )
+
     def _utm_to_wgs84(self, geometry) -> Polygon:
         """Converte geometria de UTM para WGS84."""
         if isinstance(geometry, MultiPolygon):
-            geometry = max(geometry.geoms, key=lambda p: p.area)
+            geometry = largest_polygon(geometry)
 
-        gdf = gpd.GeoDataFrame({'geometry': [geometry]}, crs=UTM_CRS_SP)
-        return gdf.to_crs(DEFAULT_CRS).geometry.iloc[0]
+        return transform_geometry(geometry, UTM_CRS_SP, DEFAULT_CRS)
@@ -16,6 +16,8 @@ OUTPUT_DIR = PROJECT_ROOT / 'output'
 TOPODATA_DIR = DATA_DIR / 'topodata'
 IBGE_DIR = DATA_DIR / 'ibge'
 MAPBIOMAS_DIR = DATA_DIR / 'mapbiomas'
+OSM_CACHE_DIR = DATA_DIR / 'osm_cache'
+KML_CACHE_DIR = DATA_DIR / 'kml_cache'
 
 # ============================================
 # SISTEMA DE REFERÊNCIA DE COORDENADAS
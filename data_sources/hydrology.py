@@ -3,33 +3,327 @@ Coleta de dados hidrográficos de fontes públicas.
 Suporta dados locais (IBGE) e busca online (OpenStreetMap).
 """
 import geopandas as gpd
-from shapely.geometry import Polygon, Point, LineString, box, shape
-from shapely.ops import unary_union
-import requests
+import numpy as np
+import pandas as pd
+import shapely
+from shapely.geometry import Polygon, box, shape
+import hashlib
+import itertools
+import json
 import logging
+import math
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from pathlib import Path
 from typing import Optional
 import time
 
 import sys
-sys.path.insert(0, str(Path(__file__).parent.parent))
+_PROJECT_ROOT = str(Path(__file__).parent.parent)
+if _PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, _PROJECT_ROOT)
 from config import DEFAULT_CRS, UTM_CRS_SP, IBGE_DIR
+from geospatial.projection import transform_geometry
+
+try:
+    import pyogrio  # noqa: F401
+    _READ_ENGINE = 'pyogrio'
+except ImportError:
+    _READ_ENGINE = 'fiona'
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    from numba import njit
+except ImportError:  # numba é opcional; sem ele usa-se o STRtree
+    njit = None
 
 logger = logging.getLogger(__name__)
 
 # API Overpass para OpenStreetMap
 OVERPASS_URL = "https://overpass-api.de/api/interpreter"
 
+# Consultas simultâneas permitidas à Overpass (política de uso justo)
+OVERPASS_MAX_CONCURRENT = 2
+
+# Bbox arredondado para fora (≈100m) para reaproveitar respostas em cache
+_OSM_BBOX_DECIMALS = 3
+
+# Validade das respostas Overpass em cache no disco (segundos)
+OSM_CACHE_TTL_S = 7 * 24 * 3600
+
+
+@lru_cache(maxsize=128)
+def _search_buffer(polygon_wkb: bytes, buffer_km: float) -> Polygon:
+    """
+    Área de busca com buffer em km, em cache por (WKB, buffer_km).
+
+    Consultas repetidas para o mesmo imóvel e buffer não refazem a
+    reprojeção de ida e volta para UTM. Geometrias Shapely são imutáveis,
+    então o resultado pode ser compartilhado.
+    """
+    # Converter para UTM, aplicar buffer, converter de volta
+    polygon_utm = transform_geometry(
+        shapely.from_wkb(polygon_wkb), DEFAULT_CRS, UTM_CRS_SP
+    )
+    buffered = polygon_utm.buffer(buffer_km * 1000)
+
+    return transform_geometry(buffered, UTM_CRS_SP, DEFAULT_CRS)
+
+
+def _overpass_bbox(bounds: tuple) -> str:
+    """Converte (minx, miny, maxx, maxy) em bbox Overpass (lat,lon,lat,lon)."""
+    scale = 10 ** _OSM_BBOX_DECIMALS
+    minx, miny = (math.floor(v * scale) / scale for v in bounds[:2])
+    maxx, maxy = (math.ceil(v * scale) / scale for v in bounds[2:])
+    return f"{miny},{minx},{maxy},{maxx}"
+
+
+def _json_loads(raw: bytes):
+    """Decodifica JSON com orjson quando disponível (parser em C)."""
+    if orjson is not None:
+        return orjson.loads(raw)
+    return json.loads(raw)
+
+
+# Largura estimada (m) por tag waterway do OSM; demais tipos: 3m
+_OSM_LARGURA_POR_TIPO = {
+    'river': 15.0,
+    'stream': 5.0,
+    'canal': 8.0,
+}
+
+
+# Nomes de arquivos locais aceitos, em ordem de preferência
+_RIVER_FILES = ('hidrografia.shp', 'drenagem.shp', 'rios.shp', 'cursos_dagua.shp')
+_LAKE_FILES = ('lagos.shp', 'massas_dagua.shp', 'reservatorios.shp')
+
+
+def _find_local_files(data_dir: Path, candidates: tuple) -> tuple:
+    """
+    Arquivos candidatos existentes em data_dir, na ordem de preferência.
+
+    Nomes comparados sem diferenciar maiúsculas (como Path.exists no
+    Windows). A listagem fica em cache enquanto o mtime do diretório não
+    mudar; diretório ausente não é guardado em cache.
+    """
+    try:
+        mtime_ns = os.stat(data_dir).st_mtime_ns
+    except OSError:
+        return ()
+
+    return _scan_local_files(data_dir, candidates, mtime_ns)
+
+
+@lru_cache(maxsize=32)
+def _scan_local_files(data_dir: Path, candidates: tuple, mtime_ns: int) -> tuple:
+    """Lista data_dir uma vez (os.scandir) por versão (mtime) do diretório."""
+    try:
+        with os.scandir(data_dir) as entries:
+            existentes = {e.name.casefold(): e.name for e in entries if e.is_file()}
+    except OSError:
+        return ()
+
+    return tuple(
+        data_dir / existentes[name.casefold()]
+        for name in candidates if name.casefold() in existentes
+    )
+
+
+def _read_in_area(filepath: Path, area: Polygon) -> gpd.GeoDataFrame:
+    """
+    Lê apenas as feições cujo envelope intersecta a área (WGS84).
+
+    O filtro bbox é resolvido pelo driver OGR (índice espacial do arquivo,
+    quando existir); o geopandas reprojeta a área para o CRS do arquivo.
+    """
+    mask = gpd.GeoSeries([area], crs=DEFAULT_CRS)
+    return gpd.read_file(filepath, engine=_READ_ENGINE, bbox=mask)
+
+
+def _filter_intersecting(gdf: gpd.GeoDataFrame, area: Polygon) -> gpd.GeoDataFrame:
+    """
+    Filtra feições que intersectam a área usando o índice espacial.
+
+    O sindex descarta candidatos pelo envelope antes do teste exato;
+    a ordem original das feições é mantida.
+    """
+    idx = gdf.sindex.query(area, predicate='intersects')
+    return gdf.iloc[np.sort(idx)]
+
+
+def _keep_mask_strtree(geoms: np.ndarray, tolerance_m: float) -> np.ndarray:
+    """Máscara de pontos mantidos via pares candidatos do STRtree."""
+    keep = np.ones(len(geoms), dtype=bool)
+
+    # Pares candidatos via índice espacial; distância exata confirmada no GEOS
+    tree = shapely.STRtree(geoms)
+    i, j = tree.query(geoms, predicate='dwithin', distance=tolerance_m)
+    pares = i < j
+    i, j = i[pares], j[pares]
+    proximos = shapely.distance(geoms[i], geoms[j]) < tolerance_m
+    i, j = i[proximos], j[proximos]
+
+    # Varredura na ordem original: só pontos mantidos descartam vizinhos
+    ordem = np.lexsort((j, i))
+    for a, b in zip(i[ordem], j[ordem]):
+        if keep[a]:
+            keep[b] = False
+
+    return keep
+
+
+if njit is not None:
+    @njit(cache=True)
+    def _keep_mask_numba(xy, tolerance_m):
+        """
+        Máscara de pontos mantidos com grade de células de lado tolerance_m.
+
+        Cada ponto, na ordem original, é comparado apenas com os pontos já
+        mantidos nas 9 células vizinhas; as células guardam listas
+        encadeadas (head/nxt) dos pontos mantidos.
+        """
+        n = xy.shape[0]
+        cx = np.floor(xy[:, 0] / tolerance_m).astype(np.int64)
+        cy = np.floor(xy[:, 1] / tolerance_m).astype(np.int64)
+        cx = cx - cx.min() + 1
+        cy = cy - cy.min() + 1
+        height = cy.max() + 2
+        keys = cx * height + cy
+        cells = np.unique(keys)
+
+        head = np.full(len(cells), -1, dtype=np.int64)
+        nxt = np.full(n, -1, dtype=np.int64)
+        keep = np.zeros(n, dtype=np.bool_)
+
+        for p in range(n):
+            duplicado = False
+            for ddx in range(-1, 2):
+                for ddy in range(-1, 2):
+                    key = keys[p] + ddx * height + ddy
+                    c = np.searchsorted(cells, key)
+                    if c >= len(cells) or cells[c] != key:
+                        continue
+                    q = head[c]
+                    while q >= 0:
+                        dx = xy[p, 0] - xy[q, 0]
+                        dy = xy[p, 1] - xy[q, 1]
+                        if math.sqrt(dx * dx + dy * dy) < tolerance_m:
+                            duplicado = True
+                            break
+                        q = nxt[q]
+                    if duplicado:
+                        break
+                if duplicado:
+                    break
+
+            if not duplicado:
+                keep[p] = True
+                c = np.searchsorted(cells, keys[p])
+                nxt[p] = head[c]
+                head[c] = p
+
+        return keep
+
+
+def _nearby_duplicates_keep_mask(geoms: np.ndarray, tolerance_m: float) -> np.ndarray:
+    """
+    Máscara de pontos mantidos ao remover duplicatas próximas.
+
+    Percorre os pontos na ordem original; um ponto é descartado se estiver
+    a menos de tolerance_m de um ponto anterior mantido. Usa Numba se
+    instalado, senão STRtree.
+    """
+    if len(geoms) < 2 or not tolerance_m > 0:
+        return np.ones(len(geoms), dtype=bool)
+    if njit is not None:
+        xy = np.column_stack((shapely.get_x(geoms), shapely.get_y(geoms)))
+        return _keep_mask_numba(xy, float(tolerance_m))
+    return _keep_mask_strtree(geoms, tolerance_m)
+
+
+def _osm_way_coords(data: dict, min_nodes: int) -> tuple:
+    """
+    Resolve os nodes de cada way OSM em um buffer único de coordenadas.
+
+    Nodes ausentes na resposta são ignorados; ways com menos de
+    min_nodes coordenadas resolvidas são descartadas.
+
+    Args:
+        data: Resposta JSON da API Overpass
+        min_nodes: Número mínimo de coordenadas por way
+
+    Returns:
+        Tupla (coords Nx2, índice da geometria por coordenada, ways)
+    """
+    elements = data.get('elements', [])
+    nodes = [e for e in elements if e['type'] == 'node']
+    way_elements = [e for e in elements if e['type'] == 'way']
+
+    # Índice de nodes: ids ordenados + coordenadas paralelas (busca binária)
+    node_ids = np.fromiter((e['id'] for e in nodes), np.int64, len(nodes))
+    node_xy = np.array([(e['lon'], e['lat']) for e in nodes], dtype=float)
+    node_xy = node_xy.reshape(-1, 2)
+    order = np.argsort(node_ids, kind='stable')
+    node_ids, node_xy = node_ids[order], node_xy[order]
+
+    # Referências de todas as ways em um único array
+    lengths = np.fromiter(
+        (len(e.get('nodes', [])) for e in way_elements), np.int64, len(way_elements)
+    )
+    way_nodes = np.fromiter(
+        itertools.chain.from_iterable(e.get('nodes', []) for e in way_elements),
+        np.int64, lengths.sum()
+    )
+    way_idx = np.repeat(np.arange(len(way_elements)), lengths)
+
+    if len(node_ids):
+        pos = np.minimum(np.searchsorted(node_ids, way_nodes), len(node_ids) - 1)
+        found = node_ids[pos] == way_nodes
+    else:
+        pos = np.zeros(len(way_nodes), dtype=np.int64)
+        found = np.zeros(len(way_nodes), dtype=bool)
+
+    valid = np.bincount(way_idx[found], minlength=len(way_elements)) >= min_nodes
+    keep = found & valid[way_idx]
+
+    coords = node_xy[pos[keep]]
+    indices = (np.cumsum(valid) - 1)[way_idx[keep]]
+    ways = [e for e, ok in zip(way_elements, valid) if ok]
+
+    return coords, indices, ways
+
 
 class HydrologyCollector:
     """Coletor de dados hidrográficos."""
 
-    def __init__(self, data_dir: Path = None):
+    def __init__(
+        self,
+        data_dir: Path = None,
+        osm_cache_dir: Path = None,
+        cache_layers: bool = False
+    ):
         """
         Args:
             data_dir: Diretório com dados IBGE (opcional)
+            osm_cache_dir: Diretório de cache em disco das respostas Overpass
+                (opcional; sem ele as respostas ficam só em memória)
+            cache_layers: Manter camadas locais completas em memória entre
+                chamadas (útil ao processar vários imóveis)
         """
         self.data_dir = data_dir or IBGE_DIR
+        self.osm_cache_dir = Path(osm_cache_dir) if osm_cache_dir else None
+        self.cache_layers = cache_layers
+        self._osm_responses: dict = {}
+        self._layer_cache: dict = {}
+        self._session = None
+        self._session_lock = threading.Lock()
+        self._overpass_slots = threading.Semaphore(OVERPASS_MAX_CONCURRENT)
 
     def get_rivers_in_area(
         self,
@@ -73,6 +367,32 @@ class HydrologyCollector:
         logger.info(f"Encontrados {len(rivers)} cursos d'água")
         return rivers
 
+    def get_rivers_in_areas(
+        self,
+        polygons: list,
+        buffer_km: float = 2,
+        max_workers: int = 8
+    ) -> list:
+        """
+        Busca rios para vários imóveis em paralelo.
+
+        As consultas ao OSM são limitadas a OVERPASS_MAX_CONCURRENT
+        simultâneas e compartilham a mesma sessão HTTP.
+
+        Args:
+            polygons: Perímetros dos imóveis
+            buffer_km: Buffer de busca em km
+            max_workers: Número máximo de threads
+
+        Returns:
+            Lista de GeoDataFrames, na ordem dos polígonos
+        """
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            return list(executor.map(
+                lambda polygon: self.get_rivers_in_area(polygon, buffer_km),
+                polygons
+            ))
+
     def get_lakes_in_area(self, polygon: Polygon) -> gpd.GeoDataFrame:
         """
         Busca lagos e lagoas dentro do polígono.
@@ -101,8 +421,10 @@ class HydrologyCollector:
 
         # Calcular área se não existir
         if 'area_ha' not in lakes.columns and not lakes.empty:
-            lakes_utm = lakes.to_crs(UTM_CRS_SP)
-            lakes['area_ha'] = lakes_utm.geometry.area / 10000
+            lakes_utm = transform_geometry(
+                lakes.geometry.values, DEFAULT_CRS, UTM_CRS_SP
+            )
+            lakes['area_ha'] = shapely.area(lakes_utm) / 10000
 
         logger.info(f"Encontrados {len(lakes)} lagos/lagoas")
         return lakes
@@ -113,15 +435,7 @@ class HydrologyCollector:
         buffer_km: float
     ) -> Polygon:
         """Cria área de busca com buffer em km."""
-        # Converter para UTM, aplicar buffer, converter de volta
-        gdf = gpd.GeoDataFrame({'geometry': [polygon]}, crs=DEFAULT_CRS)
-        gdf_utm = gdf.to_crs(UTM_CRS_SP)
-
-        buffer_m = buffer_km * 1000
-        buffered = gdf_utm.geometry.iloc[0].buffer(buffer_m)
-
-        gdf_buffered = gpd.GeoDataFrame({'geometry': [buffered]}, crs=UTM_CRS_SP)
-        return gdf_buffered.to_crs(DEFAULT_CRS).geometry.iloc[0]
+        return _search_buffer(polygon.wkb, float(buffer_km))
 
     def _load_local_rivers(
         self,
@@ -129,48 +443,61 @@ class HydrologyCollector:
     ) -> Optional[gpd.GeoDataFrame]:
         """Carrega rios de arquivo local IBGE."""
         # Procurar arquivos de hidrografia
-        possible_files = [
-            self.data_dir / 'hidrografia.shp',
-            self.data_dir / 'drenagem.shp',
-            self.data_dir / 'rios.shp',
-            self.data_dir / 'cursos_dagua.shp',
-        ]
-
-        for filepath in possible_files:
-            if filepath.exists():
-                logger.info(f"Carregando hidrografia de {filepath}")
-                try:
-                    rivers = gpd.read_file(filepath)
-                    rivers = rivers.to_crs(DEFAULT_CRS)
-                    # Filtrar pela área de busca
-                    rivers = rivers[rivers.intersects(search_area)]
-                    return rivers
-                except Exception as e:
-                    logger.error(f"Erro ao carregar {filepath}: {e}")
+        for filepath in _find_local_files(Path(self.data_dir), _RIVER_FILES):
+            logger.info(f"Carregando hidrografia de {filepath}")
+            try:
+                return self._load_layer_in_area(filepath, search_area)
+            except Exception as e:
+                logger.error(f"Erro ao carregar {filepath}: {e}")
 
         return None
 
     def _load_local_lakes(self, polygon: Polygon) -> Optional[gpd.GeoDataFrame]:
         """Carrega lagos de arquivo local."""
-        possible_files = [
-            self.data_dir / 'lagos.shp',
-            self.data_dir / 'massas_dagua.shp',
-            self.data_dir / 'reservatorios.shp',
-        ]
-
-        for filepath in possible_files:
-            if filepath.exists():
-                logger.info(f"Carregando lagos de {filepath}")
-                try:
-                    lakes = gpd.read_file(filepath)
-                    lakes = lakes.to_crs(DEFAULT_CRS)
-                    lakes = lakes[lakes.intersects(polygon)]
-                    return lakes
-                except Exception as e:
-                    logger.error(f"Erro ao carregar {filepath}: {e}")
+        for filepath in _find_local_files(Path(self.data_dir), _LAKE_FILES):
+            logger.info(f"Carregando lagos de {filepath}")
+            try:
+                return self._load_layer_in_area(filepath, polygon)
+            except Exception as e:
+                logger.error(f"Erro ao carregar {filepath}: {e}")
 
         return None
 
+    def _load_layer_in_area(
+        self,
+        filepath: Path,
+        area: Polygon
+    ) -> gpd.GeoDataFrame:
+        """
+        Carrega feições de uma camada local que intersectam a área.
+
+        Sem cache, lê apenas o bbox da área. Com cache_layers, a camada
+        completa é lida uma vez (recarregada se o arquivo mudar) e o sindex
+        do geopandas é reaproveitado entre consultas. O filtro é feito no
+        CRS do arquivo; só as feições selecionadas são reprojetadas.
+
+        Args:
+            filepath: Arquivo da camada
+            area: Área de busca (WGS84)
+
+        Returns:
+            GeoDataFrame em DEFAULT_CRS filtrado pela área
+        """
+        if not self.cache_layers:
+            layer = _read_in_area(filepath, area)
+        else:
+            mtime = filepath.stat().st_mtime_ns
+            cached = self._layer_cache.get(filepath)
+
+            if cached is None or cached[0] != mtime:
+                cached = (mtime, gpd.read_file(filepath, engine=_READ_ENGINE))
+                self._layer_cache[filepath] = cached
+
+            layer = cached[1]
+
+        area_native = transform_geometry(area, DEFAULT_CRS, layer.crs.to_string())
+        return _filter_intersecting(layer, area_native).to_crs(DEFAULT_CRS)
+
     def _fetch_rivers_from_osm(
         self,
         search_area: Polygon
@@ -184,8 +511,10 @@ class HydrologyCollector:
         Returns:
             GeoDataFrame com rios ou None
         """
-        bounds = search_area.bounds  # (minx, miny, maxx, maxy)
-        bbox = f"{bounds[1]},{bounds[0]},{bounds[3]},{bounds[2]}"  # lat,lon,lat,lon
+        # Importado sob demanda: só necessário quando há consulta ao OSM
+        import requests
+
+        bbox = _overpass_bbox(search_area.bounds)
 
         # Query Overpass para waterways
         query = f"""
@@ -204,13 +533,7 @@ class HydrologyCollector:
 
         try:
             logger.info("Consultando OpenStreetMap (Overpass API)...")
-            response = requests.post(
-                OVERPASS_URL,
-                data={'data': query},
-                timeout=90
-            )
-            response.raise_for_status()
-            data = response.json()
+            data = self._query_overpass(query)
 
             rivers = self._parse_osm_ways(data, search_area)
 
@@ -241,8 +564,10 @@ class HydrologyCollector:
         Returns:
             GeoDataFrame com lagos ou None
         """
-        bounds = polygon.bounds
-        bbox = f"{bounds[1]},{bounds[0]},{bounds[3]},{bounds[2]}"
+        # Importado sob demanda: só necessário quando há consulta ao OSM
+        import requests
+
+        bbox = _overpass_bbox(polygon.bounds)
 
         # Query Overpass para water bodies
         query = f"""
@@ -261,13 +586,7 @@ class HydrologyCollector:
 
         try:
             logger.info("Consultando lagos no OpenStreetMap...")
-            response = requests.post(
-                OVERPASS_URL,
-                data={'data': query},
-                timeout=90
-            )
-            response.raise_for_status()
-            data = response.json()
+            data = self._query_overpass(query)
 
             lakes = self._parse_osm_areas(data, polygon)
 
@@ -285,6 +604,87 @@ class HydrologyCollector:
 
         return None
 
+    def _query_overpass(self, query: str) -> dict:
+        """
+        Executa query na API Overpass com cache em memória e, se
+        osm_cache_dir foi informado, em disco.
+
+        Respostas em disco valem por OSM_CACHE_TTL_S. Respostas com
+        'remark' (timeout ou erro de execução na Overpass, com elementos
+        possivelmente truncados) não entram em nenhum cache.
+
+        Args:
+            query: Query Overpass QL
+
+        Returns:
+            Resposta JSON da API
+        """
+        key = hashlib.sha1(query.encode('utf-8')).hexdigest()
+
+        if key in self._osm_responses:
+            return self._osm_responses[key]
+
+        cache_file = None
+        if self.osm_cache_dir is not None:
+            cache_file = self.osm_cache_dir / f'{key}.json'
+            data = self._read_osm_cache(cache_file)
+            if data is not None:
+                self._osm_responses[key] = data
+                return data
+
+        with self._overpass_slots:
+            response = self._get_session().post(
+                OVERPASS_URL,
+                data={'data': query},
+                timeout=90
+            )
+        response.raise_for_status()
+        data = _json_loads(response.content)
+
+        if data.get('remark'):
+            logger.warning(f"Resposta Overpass incompleta, não será reaproveitada: {data['remark']}")
+            return data
+
+        # Grava os bytes recebidos, sem serializar o JSON novamente
+        if cache_file is not None:
+            try:
+                self.osm_cache_dir.mkdir(parents=True, exist_ok=True)
+                tmp_file = cache_file.with_suffix(
+                    f'.{os.getpid()}.{threading.get_ident()}.tmp'
+                )
+                tmp_file.write_bytes(response.content)
+                tmp_file.replace(cache_file)
+            except OSError as e:
+                logger.warning(f"Não foi possível gravar cache OSM: {e}")
+
+        self._osm_responses[key] = data
+        return data
+
+    def _read_osm_cache(self, cache_file: Path) -> Optional[dict]:
+        """Resposta em cache no disco, ou None se ausente, expirada ou ilegível."""
+        try:
+            age_s = time.time() - cache_file.stat().st_mtime
+            if age_s > OSM_CACHE_TTL_S:
+                return None
+            data = _json_loads(cache_file.read_bytes())
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning(f"Cache OSM ilegível, consultando novamente: {e}")
+            return None
+
+        logger.info(f"Usando resposta OSM em cache: {cache_file.name}")
+        return data
+
+    def _get_session(self):
+        """Retorna sessão HTTP (keep-alive) compartilhada entre consultas."""
+        with self._session_lock:
+            if self._session is None:
+                import requests
+
+                self._session = requests.Session()
+            return self._session
+
     def _parse_osm_ways(self, data: dict, search_area: Polygon) -> list:
         """
         Converte dados OSM (ways) para lista de geometrias.
@@ -296,47 +696,28 @@ class HydrologyCollector:
         Returns:
             Lista de dicts com geometry e atributos
         """
-        # Criar índice de nodes
-        nodes = {}
-        for element in data.get('elements', []):
-            if element['type'] == 'node':
-                nodes[element['id']] = (element['lon'], element['lat'])
+        coords, indices, ways = _osm_way_coords(data, min_nodes=2)
+        if not ways:
+            return []
+
+        lines = shapely.linestrings(coords, indices=indices)
+
+        # Filtrar apenas linhas que intersectam a área
+        mask = shapely.intersects(lines, search_area)
 
-        # Processar ways
         rivers = []
-        for element in data.get('elements', []):
-            if element['type'] == 'way':
-                coords = []
-                for node_id in element.get('nodes', []):
-                    if node_id in nodes:
-                        coords.append(nodes[node_id])
-
-                if len(coords) >= 2:
-                    line = LineString(coords)
-
-                    # Filtrar apenas linhas que intersectam a área
-                    if line.intersects(search_area):
-                        tags = element.get('tags', {})
-                        nome = tags.get('name', '')
-                        waterway_type = tags.get('waterway', '')
-
-                        # Estimar largura baseado no tipo
-                        if waterway_type == 'river':
-                            largura = 15.0
-                        elif waterway_type == 'stream':
-                            largura = 5.0
-                        elif waterway_type == 'canal':
-                            largura = 8.0
-                        else:
-                            largura = 3.0
-
-                        rivers.append({
-                            'geometry': line,
-                            'nome': nome,
-                            'tipo': waterway_type,
-                            'largura_m': largura,
-                            'source': 'OSM'
-                        })
+        for line, element in zip(lines[mask], np.asarray(ways, dtype=object)[mask]):
+            tags = element.get('tags', {})
+            waterway_type = tags.get('waterway', '')
+
+            rivers.append({
+                'geometry': line,
+                'nome': tags.get('name', ''),
+                'tipo': waterway_type,
+                # Estimar largura baseado no tipo
+                'largura_m': _OSM_LARGURA_POR_TIPO.get(waterway_type, 3.0),
+                'source': 'OSM'
+            })
 
         return rivers
 
@@ -351,41 +732,28 @@ class HydrologyCollector:
         Returns:
             Lista de dicts com geometry e atributos
         """
-        # Criar índice de nodes
-        nodes = {}
-        for element in data.get('elements', []):
-            if element['type'] == 'node':
-                nodes[element['id']] = (element['lon'], element['lat'])
+        # Precisa de pelo menos 4 pontos para formar um polígono
+        coords, indices, ways = _osm_way_coords(data, min_nodes=4)
+        if not ways:
+            return []
+
+        # linearrings fecha o anel automaticamente se necessário
+        rings = shapely.linearrings(coords, indices=indices)
+        polys = shapely.polygons(rings)
+
+        # Ignorar polígonos inválidos
+        mask = shapely.is_valid(polys) & shapely.intersects(polys, polygon)
 
-        # Processar ways como polígonos
         lakes = []
-        for element in data.get('elements', []):
-            if element['type'] == 'way':
-                coords = []
-                for node_id in element.get('nodes', []):
-                    if node_id in nodes:
-                        coords.append(nodes[node_id])
-
-                # Precisa de pelo menos 4 pontos para formar um polígono
-                if len(coords) >= 4:
-                    # Fechar o polígono se necessário
-                    if coords[0] != coords[-1]:
-                        coords.append(coords[0])
-
-                    try:
-                        poly = Polygon(coords)
-                        if poly.is_valid and poly.intersects(polygon):
-                            tags = element.get('tags', {})
-                            nome = tags.get('name', '')
-
-                            lakes.append({
-                                'geometry': poly,
-                                'nome': nome,
-                                'tipo': tags.get('water', tags.get('natural', 'water')),
-                                'source': 'OSM'
-                            })
-                    except Exception:
-                        pass  # Ignorar polígonos inválidos
+        for poly, element in zip(polys[mask], np.asarray(ways, dtype=object)[mask]):
+            tags = element.get('tags', {})
+
+            lakes.append({
+                'geometry': poly,
+                'nome': tags.get('name', ''),
+                'tipo': tags.get('water', tags.get('natural', 'water')),
+                'source': 'OSM'
+            })
 
         return lakes
 
@@ -398,22 +766,23 @@ class HydrologyCollector:
         - Córregos/riachos: 5m
         - Desconhecidos: 5m (menor APP)
         """
-        widths = []
-
-        for idx, row in rivers.iterrows():
-            nome = str(row.get('nome', '')).lower()
-            tipo = str(row.get('tipo', '')).lower()
+        vazio = pd.Series('', index=rivers.index)
+        nome = rivers.get('nome', vazio).astype(str).str.lower()
+        tipo = rivers.get('tipo', vazio).astype(str).str.lower()
 
-            if 'rio' in nome or 'rio' in tipo:
-                widths.append(10.0)
-            elif 'córrego' in nome or 'riacho' in nome:
-                widths.append(5.0)
-            elif 'ribeirão' in nome:
-                widths.append(8.0)
-            else:
-                widths.append(5.0)  # Padrão conservador
+        # np.select respeita a precedência da primeira condição verdadeira
+        widths = np.select(
+            [
+                nome.str.contains('rio', regex=False)
+                | tipo.str.contains('rio', regex=False),
+                nome.str.contains('córrego|riacho'),
+                nome.str.contains('ribeirão', regex=False),
+            ],
+            [10.0, 5.0, 8.0],
+            default=5.0  # Padrão conservador
+        )
 
-        return widths if widths else []
+        return widths.tolist()
 
 
 class NascenteIdentifier:
@@ -422,7 +791,8 @@ class NascenteIdentifier:
     def identify_from_rivers(
         self,
         polygon: Polygon,
-        rivers: gpd.GeoDataFrame
+        rivers: gpd.GeoDataFrame,
+        exclude_on_river_m: float = None
     ) -> gpd.GeoDataFrame:
         """
         Identifica nascentes como pontos iniciais de rios.
@@ -433,14 +803,16 @@ class NascenteIdentifier:
         Args:
             polygon: Perímetro do imóvel
             rivers: GeoDataFrame com rios
+            exclude_on_river_m: Se informado, descarta pontos iniciais a
+                até essa distância (m) de outro curso d'água - trechos do
+                OSM divididos em várias ways ou afluentes que começam em
+                outro rio (consulta por STRtree)
 
         Returns:
             GeoDataFrame com pontos de nascentes
         """
         logger.info("Identificando nascentes")
 
-        nascentes = []
-
         if rivers.empty:
             return gpd.GeoDataFrame({
                 'geometry': [],
@@ -448,27 +820,30 @@ class NascenteIdentifier:
             }, crs=DEFAULT_CRS)
 
         # Buffer do perímetro para busca
-        gdf_poly = gpd.GeoDataFrame({'geometry': [polygon]}, crs=DEFAULT_CRS)
-        gdf_utm = gdf_poly.to_crs(UTM_CRS_SP)
-        buffer_100m = gdf_utm.geometry.iloc[0].buffer(100)
-        gdf_buffer = gpd.GeoDataFrame({'geometry': [buffer_100m]}, crs=UTM_CRS_SP)
-        search_area = gdf_buffer.to_crs(DEFAULT_CRS).geometry.iloc[0]
-
-        for idx, row in rivers.iterrows():
-            geom = row.geometry
-
-            if isinstance(geom, LineString):
-                # Ponto inicial do rio pode ser nascente
-                start_point = Point(geom.coords[0])
-
-                if search_area.contains(start_point):
-                    nascentes.append({
-                        'geometry': start_point,
-                        'tipo': 'NASCENTE_IDENTIFICADA'
-                    })
-
-        if nascentes:
-            gdf = gpd.GeoDataFrame(nascentes, crs=DEFAULT_CRS)
+        polygon_utm = transform_geometry(polygon, DEFAULT_CRS, UTM_CRS_SP)
+        buffer_100m = polygon_utm.buffer(100)
+        search_area = transform_geometry(buffer_100m, UTM_CRS_SP, DEFAULT_CRS)
+        shapely.prepare(search_area)
+
+        # Ponto inicial de cada rio (LineString) pode ser nascente
+        geoms = np.asarray(rivers.geometry.values)
+        lines = geoms[np.isin(shapely.get_type_id(geoms), (1, 2))]
+        start_points = shapely.get_point(lines, 0)
+        inside = np.flatnonzero(shapely.contains(search_area, start_points))
+        start_points = start_points[inside]
+
+        if exclude_on_river_m is not None and len(start_points):
+            on_river = self._starts_on_other_river(
+                start_points, inside, lines, exclude_on_river_m
+            )
+            start_points = start_points[~on_river]
+
+        if len(start_points):
+            gdf = gpd.GeoDataFrame({
+                'geometry': start_points,
+                'tipo': 'NASCENTE_IDENTIFICADA'
+            }, crs=DEFAULT_CRS)
+
             # Remover duplicatas próximas (50m)
             gdf = self._remove_nearby_duplicates(gdf, tolerance_m=50)
             logger.info(f"Identificadas {len(gdf)} nascentes")
@@ -479,6 +854,36 @@ class NascenteIdentifier:
             'tipo': []
         }, crs=DEFAULT_CRS)
 
+    def _starts_on_other_river(
+        self,
+        points: np.ndarray,
+        own_line: np.ndarray,
+        lines: np.ndarray,
+        distance_m: float
+    ) -> np.ndarray:
+        """
+        Máscara dos pontos a até distance_m de um rio que não o de origem.
+
+        Args:
+            points: Pontos iniciais (WGS84)
+            own_line: Índice, em lines, do rio de origem de cada ponto
+            lines: Rios (WGS84)
+            distance_m: Distância máxima em metros
+
+        Returns:
+            Array booleano, True para pontos sobre outro curso d'água
+        """
+        tree = shapely.STRtree(transform_geometry(lines, DEFAULT_CRS, UTM_CRS_SP))
+        point_idx, line_idx = tree.query(
+            transform_geometry(points, DEFAULT_CRS, UTM_CRS_SP),
+            predicate='dwithin', distance=distance_m
+        )
+        other = line_idx != own_line[point_idx]
+
+        on_river = np.zeros(len(points), dtype=bool)
+        on_river[point_idx[other]] = True
+        return on_river
+
     def _remove_nearby_duplicates(
         self,
         points: gpd.GeoDataFrame,
@@ -488,19 +893,7 @@ class NascenteIdentifier:
         if points.empty:
             return points
 
-        points_utm = points.to_crs(UTM_CRS_SP)
-        keep = [True] * len(points_utm)
-
-        for i in range(len(points_utm)):
-            if not keep[i]:
-                continue
-            for j in range(i + 1, len(points_utm)):
-                if not keep[j]:
-                    continue
-                dist = points_utm.geometry.iloc[i].distance(
-                    points_utm.geometry.iloc[j]
-                )
-                if dist < tolerance_m:
-                    keep[j] = False
+        geoms = np.asarray(points.to_crs(UTM_CRS_SP).geometry.values)
+        keep = _nearby_duplicates_keep_mask(geoms, tolerance_m)
 
         return points[keep].reset_index(drop=True)
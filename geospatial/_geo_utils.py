@@ -0,0 +1,40 @@
+"""
+Utilitários de geometria compartilhados (Shapely 2 vetorizado).
+"""
+import numpy as np
+import shapely
+
+# shapely.get_type_id de MultiPolygon
+_MULTIPOLYGON = 6
+
+
+def largest_polygon(geometry):
+    """
+    Maior polígono de um MultiPolygon; outras geometrias retornam como estão.
+
+    Em empate de área fica a primeira parte, como em
+    max(geom.geoms, key=lambda p: p.area).
+    """
+    if shapely.get_type_id(geometry) != _MULTIPOLYGON:
+        return geometry
+
+    parts = shapely.get_parts(geometry)
+    return parts[int(np.argmax(shapely.area(parts)))]
+
+
+def largest_polygons(geoms: np.ndarray) -> np.ndarray:
+    """
+    Versão em lote de largest_polygon para um array de geometrias.
+
+    Retorna um novo array; o de entrada não é alterado.
+    """
+    geoms = geoms.copy()
+    multi = np.flatnonzero(shapely.get_type_id(geoms) == _MULTIPOLYGON)
+    if len(multi) == 0:
+        return geoms
+
+    parts, idx = shapely.get_parts(geoms[multi], return_index=True)
+    order = np.lexsort((-shapely.area(parts), idx))
+    _, first = np.unique(idx[order], return_index=True)
+    geoms[multi[idx[order][first]]] = parts[order][first]
+    return geoms
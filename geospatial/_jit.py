@@ -0,0 +1,47 @@
+"""
+Kernels compilados com Numba (opcional).
+
+Sem Numba instalado, os kernels ficam como None e os chamadores usam
+a implementação NumPy equivalente.
+"""
+import numpy as np
+
+try:
+    from numba import njit
+except ImportError:  # numba é opcional
+    njit = None
+
+
+if njit is not None:
+    @njit(cache=True)
+    def count_decimals(values, max_decimals):
+        """
+        Casas decimais de cada valor, limitadas a max_decimals.
+
+        Conta como str(float): valores inteiros têm 1 casa ('123.0').
+        Retorna -1 quando o teste não é exato e o chamador deve usar
+        str(): notação científica (|v| < 1e-4 ou >= 1e16) ou v * 10^d
+        perto do limite de precisão inteira do float64 (>= 2^50).
+        """
+        flat = values.ravel()
+        out = np.empty(flat.size, dtype=np.int64)
+        limite = 2.0 ** 50 / 10.0 ** (max_decimals - 1)
+        for n in range(flat.size):
+            v = flat[n]
+            a = abs(v)
+            if a != 0.0 and (a < 1e-4 or a >= 1e16 or a >= limite):
+                out[n] = -1
+                continue
+
+            # Menor d tal que v tem representação exata com d casas
+            count = max_decimals
+            scale = 1.0
+            for d in range(1, max_decimals):
+                scale *= 10.0
+                if np.rint(v * scale) / scale == v:
+                    count = d
+                    break
+            out[n] = count
+        return out.reshape(values.shape)
+else:
+    count_decimals = None
@@ -1,13 +1,17 @@
 """
 Cálculo de áreas em diferentes unidades para SICAR.
 """
-import geopandas as gpd
+import numpy as np
+import shapely
 from shapely.geometry import Polygon
 from pathlib import Path
 
 import sys
-sys.path.insert(0, str(Path(__file__).parent.parent))
+_PROJECT_ROOT = str(Path(__file__).parent.parent)
+if _PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, _PROJECT_ROOT)
 from config import DEFAULT_CRS, UTM_CRS_SP
+from geospatial.projection import transform_geometry
 
 # Módulo fiscal médio de São Paulo (varia por município)
 # Fonte: INCRA - Tabela de Módulos Fiscais por Município
@@ -28,10 +32,28 @@ def calculate_area_m2(polygon: Polygon, source_crs: str = None) -> float:
     if source_crs is None:
         source_crs = DEFAULT_CRS
 
-    gdf = gpd.GeoDataFrame({'geometry': [polygon]}, crs=source_crs)
-    gdf_utm = gdf.to_crs(UTM_CRS_SP)
+    return transform_geometry(polygon, source_crs, UTM_CRS_SP).area
 
-    return gdf_utm.geometry.iloc[0].area
+
+def calculate_areas_m2(polygons, source_crs: str = None) -> np.ndarray:
+    """
+    Calcula áreas de vários polígonos em metros quadrados.
+
+    Todos os polígonos são reprojetados em uma única chamada e as áreas
+    calculadas de forma vetorizada.
+
+    Args:
+        polygons: Lista ou array de polígonos Shapely
+        source_crs: CRS de origem (default: WGS84)
+
+    Returns:
+        Array com as áreas em metros quadrados
+    """
+    if source_crs is None:
+        source_crs = DEFAULT_CRS
+
+    geometries = np.asarray(polygons, dtype=object)
+    return shapely.area(transform_geometry(geometries, source_crs, UTM_CRS_SP))
 
 
 def calculate_area_hectares(polygon: Polygon, source_crs: str = None) -> float:
@@ -70,17 +92,19 @@ def calculate_modulos_fiscais(
     return area_ha / modulo_fiscal_ha
 
 
-def get_area_summary(polygon: Polygon) -> dict:
+def get_area_summary(polygon: Polygon, source_crs: str = None) -> dict:
     """
     Retorna resumo completo de áreas de um polígono.
 
     Args:
         polygon: Polígono Shapely
+        source_crs: CRS de origem (default: WGS84; UTM_CRS_SP dispensa
+            reprojeção)
 
     Returns:
         Dict com área em diferentes unidades
     """
-    area_m2 = calculate_area_m2(polygon)
+    area_m2 = calculate_area_m2(polygon, source_crs)
     area_ha = area_m2 / 10000.0
     modulos = calculate_modulos_fiscais(area_ha)
 
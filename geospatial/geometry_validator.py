@@ -1,19 +1,38 @@
 """
 Validação e correção de geometrias para SICAR.
 """
-import geopandas as gpd
+import shapely
 from shapely.geometry import Polygon, MultiPolygon, LineString, Point
 from shapely.validation import make_valid
+from pyproj import Geod
 import logging
+import math
 from pathlib import Path
 from typing import Tuple, List
 
 import sys
-sys.path.insert(0, str(Path(__file__).parent.parent))
+_PROJECT_ROOT = str(Path(__file__).parent.parent)
+if _PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, _PROJECT_ROOT)
 from config import DEFAULT_CRS, UTM_CRS_SP, MIN_PROPERTY_AREA_M2
+from geospatial._geo_utils import largest_polygon
+from geospatial.projection import transform_geometry
 
 logger = logging.getLogger(__name__)
 
+# Elipsoide para área geodésica (triagem da área mínima sem reprojeção)
+_GEOD = Geod(ellps='WGS84')
+
+# Tolerância máxima de simplificação (~100m em graus) e passos de refino
+_SIMPLIFY_MAX_TOLERANCE = 0.001
+_SIMPLIFY_REFINE_STEPS = 3
+
+# Metros por grau no equador (envelope aproximado)
+_METROS_POR_GRAU = 111320.0
+
+# Abaixo de (1 + margem) x área mínima, confirma-se a área em UTM
+_MARGEM_AREA_GEODESICA = 0.10
+
 
 class GeometryValidator:
     """Validador de geometrias para SICAR."""
@@ -51,7 +70,7 @@ class GeometryValidator:
 
         # Se for MultiPolygon, pegar o maior
         if isinstance(geometry, MultiPolygon):
-            geometry = max(geometry.geoms, key=lambda p: p.area)
+            geometry = largest_polygon(geometry)
             errors.append("MultiPolygon convertido para o maior polígono")
 
         # 1. Corrigir auto-interseção
@@ -61,50 +80,111 @@ class GeometryValidator:
 
             # make_valid pode retornar MultiPolygon
             if isinstance(geometry, MultiPolygon):
-                geometry = max(geometry.geoms, key=lambda p: p.area)
-
-        # 2. Verificar área mínima
-        area_m2 = self._calculate_area_m2(geometry)
+                geometry = largest_polygon(geometry)
+
+        # 2. Verificar área mínima (área geodésica; UTM só perto do limite).
+        # Se nem o envelope alcança o limite, vai direto ao cálculo UTM.
+        limite_m2 = self.min_area_m2 * (1 + _MARGEM_AREA_GEODESICA)
+        area_m2 = None
+        if self._bbox_area_upper_m2(geometry) >= limite_m2:
+            area_m2 = self._geodesic_area_m2(geometry)
+        if area_m2 is None or area_m2 < limite_m2:
+            area_m2 = self._calculate_area_m2(geometry)
         if area_m2 < self.min_area_m2:
             errors.append(
                 f"Área ({area_m2:.0f} m²) abaixo do mínimo legal ({self.min_area_m2:.0f} m²)"
             )
 
         # 3. Simplificar se muito complexo
-        n_vertices = len(geometry.exterior.coords)
+        was_simplified = False
+        n_vertices = shapely.get_num_coordinates(geometry.exterior)
         if n_vertices > self.max_vertices:
             geometry = self._simplify_polygon(geometry)
-            new_vertices = len(geometry.exterior.coords)
+            was_simplified = True
+            new_vertices = shapely.get_num_coordinates(geometry.exterior)
             errors.append(
                 f"Polígono simplificado de {n_vertices} para {new_vertices} vértices"
             )
 
-        # 4. Garantir que ainda é válido após simplificação
-        if not geometry.is_valid:
+        # 4. Garantir que ainda é válido após simplificação (a geometria
+        # já foi validada no passo 1; só a simplificação pode alterá-la)
+        if was_simplified and not geometry.is_valid:
             geometry = make_valid(geometry)
             if isinstance(geometry, MultiPolygon):
-                geometry = max(geometry.geoms, key=lambda p: p.area)
+                geometry = largest_polygon(geometry)
 
         return geometry, errors
 
     def _calculate_area_m2(self, geometry: Polygon) -> float:
         """Calcula área em metros quadrados usando projeção UTM."""
-        gdf = gpd.GeoDataFrame({'geometry': [geometry]}, crs=DEFAULT_CRS)
-        gdf_utm = gdf.to_crs(UTM_CRS_SP)
-        return gdf_utm.geometry.iloc[0].area
+        return transform_geometry(geometry, DEFAULT_CRS, UTM_CRS_SP).area
+
+    def _bbox_area_upper_m2(self, geometry: Polygon) -> float:
+        """
+        Limite superior aproximado da área (m²) pelo envelope em graus.
+
+        Usa o cosseno da latitude mais próxima do equador (faixa mais
+        larga) e margem de 1% para o elipsoide.
+        """
+        minx, miny, maxx, maxy = geometry.bounds
+        lat_ref = 0.0 if miny <= 0.0 <= maxy else min(abs(miny), abs(maxy))
+        largura = (maxx - minx) * _METROS_POR_GRAU * math.cos(math.radians(lat_ref))
+        altura = (maxy - miny) * _METROS_POR_GRAU
+        return largura * altura * 1.01
+
+    def _geodesic_area_m2(self, geometry: Polygon) -> float:
+        """Área geodésica (WGS84) em m², sem reprojeção dos vértices."""
+        return abs(_GEOD.geometry_area_perimeter(geometry)[0])
 
     def _simplify_polygon(self, geometry: Polygon) -> Polygon:
-        """Simplifica polígono mantendo topologia."""
-        # Começar com tolerância pequena e aumentar até atingir max_vertices
-        tolerance = 0.00001  # ~1m em graus
+        """
+        Simplifica polígono mantendo topologia.
 
-        while len(geometry.exterior.coords) > self.max_vertices and tolerance < 0.001:
+        A tolerância inicial é estimada pelo perímetro dividido pelo
+        número de vértices desejado (em geral uma única chamada basta);
+        se o resultado ficar com menos da metade do limite, uma busca
+        binária curta procura tolerância menor que ainda o respeite.
+
+        Usa Douglas-Peucker do GEOS: para um único polígono é mais rápido
+        que shapely.coverage_simplify (Visvalingam-Whyatt com topologia de
+        cobertura), cuja vantagem é manter arestas compartilhadas entre
+        vários polígonos.
+        """
+        def simplify(tolerance):
             simplified = geometry.simplify(tolerance, preserve_topology=True)
             if isinstance(simplified, Polygon):
-                geometry = simplified
-            tolerance *= 2
+                return simplified
+            return None
+
+        def fits(candidate):
+            return (
+                candidate is not None
+                and shapely.get_num_coordinates(candidate.exterior) <= self.max_vertices
+            )
 
-        return geometry
+        lo = 0.0
+        hi = min(geometry.length / self.max_vertices * 0.5, _SIMPLIFY_MAX_TOLERANCE)
+        best = simplify(hi)
+
+        # Aumentar a tolerância até caber no limite de vértices
+        while not fits(best):
+            if hi >= _SIMPLIFY_MAX_TOLERANCE:
+                return best if best is not None else geometry
+            lo, hi = hi, min(hi * 4, _SIMPLIFY_MAX_TOLERANCE)
+            best = simplify(hi)
+
+        # Se simplificou demais, refinar: menor tolerância que ainda cabe
+        for _ in range(_SIMPLIFY_REFINE_STEPS):
+            if shapely.get_num_coordinates(best.exterior) >= self.max_vertices // 2:
+                break
+            mid = (lo + hi) / 2
+            candidate = simplify(mid)
+            if fits(candidate):
+                best, hi = candidate, mid
+            else:
+                lo = mid
+
+        return best
 
 
 def validate_polygon_for_sicar(geometry) -> Tuple[Polygon, List[str]]:
@@ -0,0 +1,51 @@
+"""
+Reprojeção de geometrias com Transformers pyproj em cache.
+"""
+from functools import lru_cache
+
+import numpy as np
+import shapely
+from pyproj import Transformer
+
+
+@lru_cache(maxsize=32)
+def get_transformer(src_crs: str, dst_crs: str) -> Transformer:
+    """
+    Retorna Transformer pyproj (always_xy) reaproveitado entre chamadas.
+
+    Args:
+        src_crs: CRS de origem (ex: 'EPSG:4326')
+        dst_crs: CRS de destino
+
+    Returns:
+        Transformer pyproj
+    """
+    return Transformer.from_crs(src_crs, dst_crs, always_xy=True)
+
+
+def transform_geometry(geometry, src_crs: str, dst_crs: str):
+    """
+    Reprojeta uma geometria ou array de geometrias Shapely.
+
+    Os vértices de todas as geometrias são transformados em uma única
+    chamada ao pyproj; a coordenada Z, se existir, é preservada.
+
+    Args:
+        geometry: Geometria Shapely ou array de geometrias
+        src_crs: CRS de origem
+        dst_crs: CRS de destino
+
+    Returns:
+        Geometria (ou array) reprojetada
+    """
+    if src_crs == dst_crs:
+        return geometry
+
+    transformer = get_transformer(src_crs, dst_crs)
+
+    def _project(coords: np.ndarray) -> np.ndarray:
+        out = coords.copy()
+        out[:, 0], out[:, 1] = transformer.transform(coords[:, 0], coords[:, 1])
+        return out
+
+    return shapely.transform(geometry, _project, include_z=True)
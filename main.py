@@ -11,14 +11,17 @@ Exemplo:
 import argparse
 import logging
 import sys
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 import geopandas as gpd
+import numpy as np
 
-from config import OUTPUT_DIR, DEFAULT_CRS, UTM_CRS_SP
-from geospatial.kml_parser import parse_kml, parse_kml_completo
+from config import OUTPUT_DIR, DEFAULT_CRS, UTM_CRS_SP, KML_CACHE_DIR, OSM_CACHE_DIR
+from geospatial.kml_parser import parse_kml, parse_kml_completo, set_parse_cache_dir
 from geospatial.geometry_validator import GeometryValidator
-from geospatial.area_calculator import get_area_summary
+from geospatial.area_calculator import get_area_summary, calculate_area_m2
+from geospatial.projection import transform_geometry
 from data_sources.hydrology import HydrologyCollector, NascenteIdentifier
 from car_layers.app_calculator import APPCalculator
 from car_layers.reserva_legal import ReservaLegalCalculator
@@ -31,6 +34,9 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Camada vazia compartilhada (somente leitura) para o parser simples
+_EMPTY_GDF = gpd.GeoDataFrame({'geometry': gpd.GeoSeries([], crs=DEFAULT_CRS)})
+
 
 def main():
     parser = argparse.ArgumentParser(
@@ -43,14 +49,24 @@ def main():
                        help='Bioma do imóvel')
     parser.add_argument('--verbose', '-v', action='store_true',
                        help='Modo verbose')
+    parser.add_argument('--cache-kml', action='store_true',
+                       help='Reaproveitar leitura do KML entre execuções (cache em disco)')
+    parser.add_argument('--cache-osm', action='store_true',
+                       help='Reaproveitar respostas da API Overpass entre execuções (cache em disco)')
 
     args = parser.parse_args()
 
     if args.verbose:
         logging.getLogger().setLevel(logging.DEBUG)
 
+    if args.cache_kml:
+        set_parse_cache_dir(KML_CACHE_DIR)
+
     try:
-        run_pipeline(args.kml_file, args.nome, args.bioma)
+        run_pipeline(
+            args.kml_file, args.nome, args.bioma,
+            osm_cache_dir=OSM_CACHE_DIR if args.cache_osm else None
+        )
     except Exception as e:
         logger.error(f"Erro fatal: {e}")
         import traceback
@@ -58,10 +74,12 @@ def main():
         sys.exit(1)
 
 
-def run_pipeline(kml_path: str, nome: str, bioma: str):
+def run_pipeline(kml_path: str, nome: str, bioma: str, osm_cache_dir: Path = None):
     """
     Executa o pipeline completo de geração de arquivos CAR.
     Detecta automaticamente se o KML contém hidrografia local.
+
+    osm_cache_dir ativa o cache em disco das respostas Overpass.
     """
     logger.info("=" * 60)
     logger.info("AUTO CAR Generator - Iniciando processamento")
@@ -94,9 +112,8 @@ def run_pipeline(kml_path: str, nome: str, bioma: str):
 
     except Exception as e:
         logger.warning(f"Erro ao ler KML completo, usando parser simples: {e}")
-        gdf_input, perimeter = parse_kml(kml_path)
-        corregos_local = gpd.GeoDataFrame({'geometry': []}, crs=DEFAULT_CRS)
-        nascentes_local = gpd.GeoDataFrame({'geometry': []}, crs=DEFAULT_CRS)
+        _, perimeter = parse_kml(kml_path)
+        corregos_local = nascentes_local = _EMPTY_GDF
         reserva_legal_manual = None
         vegetacao_nativa_manual = None
         usar_hidro_local = False
@@ -111,22 +128,28 @@ def run_pipeline(kml_path: str, nome: str, bioma: str):
         for error in validation_errors:
             logger.warning(f"Validação: {error}")
 
+    # Perímetro em UTM reprojetado uma única vez e compartilhado entre
+    # área, APP e Reserva Legal
+    perimeter_utm = transform_geometry(perimeter, DEFAULT_CRS, UTM_CRS_SP)
+
     # Calcular área total
-    area_summary = get_area_summary(perimeter)
+    area_summary = get_area_summary(perimeter_utm, source_crs=UTM_CRS_SP)
     area_total_ha = area_summary['area_ha']
+    # Fator para percentuais da área total (0 se o perímetro degenerar)
+    pct_area = 100.0 / area_total_ha if area_total_ha else 0.0
     logger.info(f"Área total do imóvel: {area_total_ha:.2f} hectares")
     logger.info(f"Módulos fiscais: {area_summary['modulos_fiscais']:.2f}")
 
-    # Criar GeoDataFrame do perímetro
-    perimetro_gdf = gpd.GeoDataFrame([{
-        'geometry': perimeter,
-        'cod_imovel': '',
-        'nom_imovel': nome,
-        'mod_fiscal': area_summary['modulos_fiscais'],
-        'num_area': round(area_total_ha, 4),
-        'cod_estado': 'SP',
-        'cod_municipio': '',
-    }], crs=DEFAULT_CRS)
+    # Criar GeoDataFrame do perímetro (colunas diretas, sem inferir registros)
+    perimetro_gdf = gpd.GeoDataFrame({
+        'geometry': [perimeter],
+        'cod_imovel': [''],
+        'nom_imovel': [nome],
+        'mod_fiscal': np.array([area_summary['modulos_fiscais']], dtype=np.float64),
+        'num_area': np.array([round(area_total_ha, 4)], dtype=np.float64),
+        'cod_estado': ['SP'],
+        'cod_municipio': [''],
+    }, crs=DEFAULT_CRS)
 
     # ===========================================
     # FASE 2: Coleta de dados de hidrografia
@@ -142,9 +165,14 @@ def run_pipeline(kml_path: str, nome: str, bioma: str):
     else:
         # Buscar hidrografia externa (OSM)
         logger.info("Buscando hidrografia externa...")
-        hydro_collector = HydrologyCollector()
-        hidrografia_gdf = hydro_collector.get_rivers_in_area(perimeter, buffer_km=2)
-        lagos_gdf = hydro_collector.get_lakes_in_area(perimeter)
+        hydro_collector = HydrologyCollector(osm_cache_dir=osm_cache_dir)
+
+        # Rios e lagos em paralelo: as consultas são limitadas por rede
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            fut_rios = executor.submit(hydro_collector.get_rivers_in_area, perimeter, buffer_km=2)
+            fut_lagos = executor.submit(hydro_collector.get_lakes_in_area, perimeter)
+            hidrografia_gdf = fut_rios.result()
+            lagos_gdf = fut_lagos.result()
 
         # Identificar nascentes a partir dos rios
         logger.info("Identificando nascentes...")
@@ -156,57 +184,59 @@ def run_pipeline(kml_path: str, nome: str, bioma: str):
     # ===========================================
     logger.info("FASE 3: Cálculo das camadas CAR")
 
+    # Presença de cada camada, avaliada uma única vez
+    tem_hidro = not hidrografia_gdf.empty
+    tem_nascentes = not nascentes_gdf.empty
+    tem_lagos = not lagos_gdf.empty
+
     # APP
     logger.info("Calculando APPs...")
-    app_calc = APPCalculator(perimeter)
+    app_calc = APPCalculator(perimeter, perimeter_utm=perimeter_utm)
     app_gdf = app_calc.calculate_all_apps(
-        rivers_gdf=hidrografia_gdf if not hidrografia_gdf.empty else None,
-        nascentes_gdf=nascentes_gdf if not nascentes_gdf.empty else None,
-        lagos_gdf=lagos_gdf if not lagos_gdf.empty else None
+        rivers_gdf=hidrografia_gdf if tem_hidro else None,
+        nascentes_gdf=nascentes_gdf if tem_nascentes else None,
+        lagos_gdf=lagos_gdf if tem_lagos else None
     )
+    tem_app = app_gdf is not None and not app_gdf.empty
 
     # Reserva Legal
     if usar_rl_manual:
         logger.info("Usando Reserva Legal definida manualmente no KML")
         # Calcular área da RL manual
-        rl_gdf_temp = gpd.GeoDataFrame({'geometry': [reserva_legal_manual]}, crs=DEFAULT_CRS)
-        rl_utm = rl_gdf_temp.to_crs(UTM_CRS_SP)
-        rl_area_ha = rl_utm.geometry.iloc[0].area / 10000
-
-        reserva_legal_gdf = gpd.GeoDataFrame([{
-            'geometry': reserva_legal_manual,
-            'cod_rl': 'RL_001',
-            'ind_averbada': 'NAO',
-            'num_matricula': '',
-            'num_area': round(rl_area_ha, 4),
-            'pct_exigido': 20.0,
-            'area_exigida_ha': round(area_total_ha * 0.20, 4)
-        }], crs=DEFAULT_CRS)
-
-        logger.info(f"Reserva Legal manual: {rl_area_ha:.2f} ha ({rl_area_ha/area_total_ha*100:.1f}%)")
+        rl_area_ha = calculate_area_m2(reserva_legal_manual) / 10000
+
+        reserva_legal_gdf = gpd.GeoDataFrame({
+            'geometry': [reserva_legal_manual],
+            'cod_rl': ['RL_001'],
+            'ind_averbada': ['NAO'],
+            'num_matricula': [''],
+            'num_area': np.array([round(rl_area_ha, 4)], dtype=np.float64),
+            'pct_exigido': np.array([20.0], dtype=np.float64),
+            'area_exigida_ha': np.array([round(area_total_ha * 0.20, 4)], dtype=np.float64)
+        }, crs=DEFAULT_CRS)
+
+        logger.info(f"Reserva Legal manual: {rl_area_ha:.2f} ha ({rl_area_ha*pct_area:.1f}%)")
     else:
         logger.info("Calculando Reserva Legal sugerida...")
-        rl_calc = ReservaLegalCalculator(perimeter, bioma)
+        rl_calc = ReservaLegalCalculator(perimeter, bioma, perimeter_utm=perimeter_utm)
         reserva_legal_gdf = rl_calc.suggest_location(
-            app_gdf=app_gdf if not app_gdf.empty else None
+            app_gdf=app_gdf if tem_app else None
         )
 
     # Vegetação Nativa/Remanescente
     if usar_veg_manual:
         logger.info("Processando Vegetação Nativa/Remanescente do KML")
-        veg_gdf_temp = gpd.GeoDataFrame({'geometry': [vegetacao_nativa_manual]}, crs=DEFAULT_CRS)
-        veg_utm = veg_gdf_temp.to_crs(UTM_CRS_SP)
-        veg_area_ha = veg_utm.geometry.iloc[0].area / 10000
-
-        vegetacao_nativa_gdf = gpd.GeoDataFrame([{
-            'geometry': vegetacao_nativa_manual,
-            'cod_veg': 'VEG_001',
-            'tip_veg': 'REMANESCENTE',
-            'des_estagio': 'A_CLASSIFICAR',
-            'num_area': round(veg_area_ha, 4)
-        }], crs=DEFAULT_CRS)
-
-        logger.info(f"Vegetação Nativa: {veg_area_ha:.2f} ha ({veg_area_ha/area_total_ha*100:.1f}%)")
+        veg_area_ha = calculate_area_m2(vegetacao_nativa_manual) / 10000
+
+        vegetacao_nativa_gdf = gpd.GeoDataFrame({
+            'geometry': [vegetacao_nativa_manual],
+            'cod_veg': ['VEG_001'],
+            'tip_veg': ['REMANESCENTE'],
+            'des_estagio': ['A_CLASSIFICAR'],
+            'num_area': np.array([round(veg_area_ha, 4)], dtype=np.float64)
+        }, crs=DEFAULT_CRS)
+
+        logger.info(f"Vegetação Nativa: {veg_area_ha:.2f} ha ({veg_area_ha*pct_area:.1f}%)")
     else:
         vegetacao_nativa_gdf = None
 
@@ -220,9 +250,9 @@ def run_pipeline(kml_path: str, nome: str, bioma: str):
     zip_path = build_sicar_package(
         output_name=nome,
         perimetro_gdf=perimetro_gdf,
-        app_gdf=app_gdf if not app_gdf.empty else None,
+        app_gdf=app_gdf if tem_app else None,
         reserva_legal_gdf=reserva_legal_gdf,
-        hidrografia_gdf=hidrografia_gdf if not hidrografia_gdf.empty else None,
+        hidrografia_gdf=hidrografia_gdf if tem_hidro else None,
         vegetacao_nativa_gdf=vegetacao_nativa_gdf
     )
 
@@ -240,13 +270,13 @@ def run_pipeline(kml_path: str, nome: str, bioma: str):
     logger.info(f"  - Área total: {area_total_ha:.2f} ha")
     logger.info(f"  - Módulos fiscais: {area_summary['modulos_fiscais']:.2f}")
 
-    if app_gdf is not None and not app_gdf.empty:
+    if tem_app:
         app_area = app_gdf['num_area'].sum()
-        logger.info(f"  - APP total: {app_area:.2f} ha ({app_area/area_total_ha*100:.1f}%)")
+        logger.info(f"  - APP total: {app_area:.2f} ha ({app_area*pct_area:.1f}%)")
 
     if reserva_legal_gdf is not None and not reserva_legal_gdf.empty:
         rl_area = reserva_legal_gdf['num_area'].sum()
-        logger.info(f"  - Reserva Legal: {rl_area:.2f} ha ({rl_area/area_total_ha*100:.1f}%)")
+        logger.info(f"  - Reserva Legal: {rl_area:.2f} ha ({rl_area*pct_area:.1f}%)")
 
     logger.info("")
     logger.info("PRÓXIMOS PASSOS:")
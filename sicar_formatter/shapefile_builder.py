@@ -2,50 +2,142 @@
 Geração de Shapefiles formatados para upload no SICAR-SP.
 """
 import geopandas as gpd
+import numpy as np
+import os
+import shapely
+from pyproj import CRS
 import zipfile
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 import logging
-from typing import Dict, Optional
+from typing import Dict, List, Optional
 
 import sys
-sys.path.insert(0, str(Path(__file__).parent.parent))
+_PROJECT_ROOT = str(Path(__file__).parent.parent)
+if _PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, _PROJECT_ROOT)
 from config import DEFAULT_CRS, SICAR_ATTRIBUTES, OUTPUT_DIR
+from geospatial.projection import transform_geometry
 
 logger = logging.getLogger(__name__)
 
+# CRS exigido pelo SICAR, comparado com CRS.equals em cada camada
+_TARGET_CRS = CRS.from_user_input(DEFAULT_CRS)
+
+# Valor padrão de cada atributo obrigatório, por camada (calculado uma vez)
+_DEFAULT_VALUES = {
+    layer: {
+        attr: '' if dtype == str else 0.0 if dtype == float else None
+        for attr, dtype in schema.items()
+    }
+    for layer, schema in SICAR_ATTRIBUTES.items()
+}
+
+# Componentes do shapefile incluídos no ZIP
+_SHAPEFILE_EXTENSIONS = ('.shp', '.shx', '.dbf', '.prj', '.cpg')
+
+# Extensão do arquivo principal por driver OGR aceito pelo builder
+_DRIVER_SUFFIXES = {
+    'ESRI Shapefile': '.shp',
+    'FlatGeobuf': '.fgb',
+}
+
+# Coordenadas binárias (.shp/.shx) quase não comprimem e vão sem
+# compressão; atributos e texto (.dbf/.prj/.cpg) usam DEFLATE nível 1
+_ZIP_DEFLATED_EXTENSIONS = {'.dbf', '.prj', '.cpg'}
+_ZIP_COMPRESSLEVEL = 1
+
+try:
+    import pyogrio  # noqa: F401
+    _WRITE_ENGINE = 'pyogrio'
+except ImportError:
+    _WRITE_ENGINE = 'fiona'
+
 
 class SICARShapefileBuilder:
     """Builder de Shapefiles para SICAR-SP."""
 
-    def __init__(self, output_name: str, output_base: str = None):
+    def __init__(
+        self,
+        output_name: str,
+        output_base: str = None,
+        driver: str = 'ESRI Shapefile'
+    ):
         """
         Args:
             output_name: Nome base para os arquivos de saída
             output_base: Diretório base de saída (default: OUTPUT_DIR)
+            driver: Driver OGR de gravação. O SICAR exige 'ESRI Shapefile';
+                'FlatGeobuf' grava um único arquivo por camada, útil quando
+                só o conteúdo importa (ex: testes)
         """
+        if driver not in _DRIVER_SUFFIXES:
+            raise ValueError(
+                f"Driver não suportado: {driver}. "
+                f"Use um de: {', '.join(_DRIVER_SUFFIXES)}"
+            )
+
         self.output_name = output_name
+        self.driver = driver
         base = Path(output_base) if output_base else OUTPUT_DIR
-        self.output_dir = base / output_name / 'shapefiles'
-        self.output_dir.mkdir(parents=True, exist_ok=True)
+        self._output_dir = base / output_name / 'shapefiles'
+        self._output_dir_ready = False
         self.layers: Dict[str, gpd.GeoDataFrame] = {}
+        # Componentes (.shp, .shx, ...) gravados por build_shapefiles
+        self._components: Dict[str, List[Path]] = {}
+
+    @property
+    def output_dir(self) -> Path:
+        """
+        Diretório dos shapefiles, criado no primeiro acesso.
+
+        Montar camadas (add_layer) não toca o disco; o diretório só é
+        criado quando algo vai ser gravado nele.
+        """
+        if not self._output_dir_ready:
+            self._output_dir.mkdir(parents=True, exist_ok=True)
+            self._output_dir_ready = True
+        return self._output_dir
 
-    def add_layer(self, name: str, gdf: gpd.GeoDataFrame) -> None:
+    def add_layer(
+        self,
+        name: str,
+        gdf: gpd.GeoDataFrame,
+        clip_bbox: Optional[tuple] = None
+    ) -> None:
         """
         Adiciona uma camada ao builder.
 
         Args:
             name: Nome da camada (perimetro, app, reserva_legal, etc.)
             gdf: GeoDataFrame com os dados
+            clip_bbox: (minx, miny, maxx, maxy) em WGS84 - opcional; mantém
+                só as feições que intersectam o retângulo
         """
-        if gdf is None or gdf.empty:
+        if gdf is None or len(gdf) == 0:
             logger.warning(f"Camada '{name}' está vazia, ignorando")
             return
 
         # Garantir CRS WGS84
         if gdf.crs is None:
             gdf = gdf.set_crs(DEFAULT_CRS)
-        elif gdf.crs.to_epsg() != 4326:
-            gdf = gdf.to_crs(DEFAULT_CRS)
+        elif not _TARGET_CRS.equals(gdf.crs):
+            # Transformer pyproj em cache, reaproveitado entre camadas
+            geoms = transform_geometry(
+                np.asarray(gdf.geometry.values), gdf.crs.to_wkt(), DEFAULT_CRS
+            )
+            gdf = gdf.set_geometry(
+                gpd.GeoSeries(geoms, index=gdf.index, crs=DEFAULT_CRS)
+            )
+
+        # Pré-filtro espacial (STRtree) antes de ajustar atributos e gravar
+        if clip_bbox is not None:
+            tree = shapely.STRtree(gdf.geometry.values)
+            idx = tree.query(shapely.box(*clip_bbox), predicate='intersects')
+            gdf = gdf.iloc[np.sort(idx)]
+            if gdf.empty:
+                logger.warning(f"Camada '{name}' sem feições no retângulo, ignorando")
+                return
 
         # Validar e adicionar atributos obrigatórios
         gdf = self._ensure_attributes(name, gdf)
@@ -59,17 +151,15 @@ class SICARShapefileBuilder:
         gdf: gpd.GeoDataFrame
     ) -> gpd.GeoDataFrame:
         """Garante que a camada tenha os atributos obrigatórios."""
-        schema = SICAR_ATTRIBUTES.get(layer_name, {})
-
-        for attr, dtype in schema.items():
-            if attr not in gdf.columns:
-                # Adicionar atributo com valor padrão
-                if dtype == str:
-                    gdf[attr] = ''
-                elif dtype == float:
-                    gdf[attr] = 0.0
-                else:
-                    gdf[attr] = None
+        defaults = _DEFAULT_VALUES.get(layer_name, {})
+
+        # Atributos ausentes com valor padrão, adicionados de uma só vez
+        missing = {
+            attr: value for attr, value in defaults.items()
+            if attr not in gdf.columns
+        }
+        if missing:
+            gdf = gdf.assign(**missing)
 
         return gdf
 
@@ -77,30 +167,60 @@ class SICARShapefileBuilder:
         """
         Gera os shapefiles individuais.
 
+        Cada camada vai para arquivos próprios e o GDAL libera o GIL
+        durante a gravação, então as camadas são gravadas em paralelo.
+
         Returns:
             Dict com caminhos dos shapefiles gerados
         """
-        paths = {}
-
-        for name, gdf in self.layers.items():
-            shp_path = self.output_dir / f'{name}.shp'
-
-            # Salvar com encoding UTF-8
-            gdf.to_file(
-                str(shp_path),
-                driver='ESRI Shapefile',
-                encoding='UTF-8'
-            )
-
-            paths[name] = str(shp_path)
-            logger.info(f"Shapefile gerado: {shp_path}")
-
-        return paths
-
-    def build_zip(self) -> str:
+        self._components = {}
+        if not self.layers:
+            return {}
+
+        max_workers = min(len(self.layers), os.cpu_count() or 1)
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {
+                name: executor.submit(self._write_shapefile, name, gdf)
+                for name, gdf in self.layers.items()
+            }
+            self._components = {
+                name: future.result() for name, future in futures.items()
+            }
+
+        return {name: str(files[0]) for name, files in self._components.items()}
+
+    def _write_shapefile(self, name: str, gdf: gpd.GeoDataFrame) -> List[Path]:
+        """Grava uma camada e retorna seus componentes (arquivo principal primeiro)."""
+        out_path = self.output_dir / f'{name}{_DRIVER_SUFFIXES[self.driver]}'
+
+        if self.driver != 'ESRI Shapefile':
+            gdf.to_file(str(out_path), driver=self.driver, engine=_WRITE_ENGINE)
+            logger.info(f"Camada gerada ({self.driver}): {out_path}")
+            return [out_path]
+
+        # Salvar com encoding UTF-8 (pyogrio grava em lote via GDAL)
+        gdf.to_file(
+            str(out_path),
+            driver='ESRI Shapefile',
+            engine=_WRITE_ENGINE,
+            encoding='UTF-8'
+        )
+
+        logger.info(f"Shapefile gerado: {out_path}")
+        return [
+            out_path.with_suffix(ext) for ext in _SHAPEFILE_EXTENSIONS
+            if out_path.with_suffix(ext).exists()
+        ]
+
+    def build_zip(self, compression: Optional[int] = None) -> str:
         """
         Gera ZIP com todos os shapefiles para upload no SICAR.
 
+        Args:
+            compression: Método zipfile aplicado a todos os componentes
+                (ex: zipfile.ZIP_STORED). Default: .shp/.shx sem compressão
+                e demais componentes com DEFLATE nível 1
+
         Returns:
             Caminho do arquivo ZIP
         """
@@ -109,11 +229,21 @@ class SICARShapefileBuilder:
 
         zip_path = self.output_dir.parent / 'car_upload.zip'
 
-        with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as zf:
-            for file in self.output_dir.iterdir():
-                # Incluir todos os componentes do shapefile
-                if file.suffix in ['.shp', '.shx', '.dbf', '.prj', '.cpg']:
-                    zf.write(file, file.name)
+        # Apenas os componentes das camadas recém-gravadas, sem varrer o
+        # diretório (que pode ter sobras de execuções anteriores)
+        with zipfile.ZipFile(zip_path, 'w') as zf:
+            for files in self._components.values():
+                for file in files:
+                    if compression is not None:
+                        zf.write(file, file.name, compress_type=compression)
+                    elif file.suffix in _ZIP_DEFLATED_EXTENSIONS:
+                        zf.write(
+                            file, file.name,
+                            compress_type=zipfile.ZIP_DEFLATED,
+                            compresslevel=_ZIP_COMPRESSLEVEL
+                        )
+                    else:
+                        zf.write(file, file.name, compress_type=zipfile.ZIP_STORED)
                     logger.debug(f"Adicionado ao ZIP: {file.name}")
 
         logger.info(f"ZIP gerado: {zip_path}")
@@ -143,7 +273,7 @@ class SICARShapefileBuilder:
 
 def build_sicar_package(
     output_name: str,
-    perimetro_gdf: gpd.GeoDataFrame,
+    perimetro_gdf: gpd.GeoDataFrame = None,
     app_gdf: gpd.GeoDataFrame = None,
     reserva_legal_gdf: gpd.GeoDataFrame = None,
     vegetacao_nativa_gdf: gpd.GeoDataFrame = None,
@@ -151,7 +281,8 @@ def build_sicar_package(
     uso_restrito_gdf: gpd.GeoDataFrame = None,
     hidrografia_gdf: gpd.GeoDataFrame = None,
     servidao_gdf: gpd.GeoDataFrame = None,
-    output_base: str = None
+    output_base: str = None,
+    layers: Dict[str, gpd.GeoDataFrame] = None
 ) -> str:
     """
     Função de conveniência para gerar pacote SICAR completo.
@@ -165,9 +296,14 @@ def build_sicar_package(
     - USO_CONSOLIDADO
     - SERVIDAO_ADMINISTRATIVA
 
+    As camadas podem ser passadas pelos argumentos nomeados ou pelo dict
+    ``layers`` (nome SICAR -> GeoDataFrame), que também aceita camadas
+    extras; em caso de nome repetido, vale o ``layers``.
+
     Args:
         output_name: Nome do imóvel/saída
-        perimetro_gdf: GeoDataFrame do perímetro (obrigatório)
+        perimetro_gdf: GeoDataFrame do perímetro (obrigatório, aqui ou
+            como 'AREA_IMOVEL' em layers)
         app_gdf: GeoDataFrame das APPs
         reserva_legal_gdf: GeoDataFrame da Reserva Legal
         vegetacao_nativa_gdf: GeoDataFrame da vegetação nativa
@@ -176,20 +312,36 @@ def build_sicar_package(
         hidrografia_gdf: GeoDataFrame da hidrografia
         servidao_gdf: GeoDataFrame das servidões
         output_base: Diretório base de saída
+        layers: Dict nome SICAR -> GeoDataFrame (opcional)
 
     Returns:
         Caminho do arquivo ZIP
+
+    Raises:
+        ValueError: Se o perímetro (AREA_IMOVEL) não for informado
     """
+    # Nomes padronizados SICAR-SP
+    camadas = {
+        'AREA_IMOVEL': perimetro_gdf,
+        'APP': app_gdf,
+        'RESERVA_LEGAL': reserva_legal_gdf,
+        'VEGETACAO_NATIVA': vegetacao_nativa_gdf,
+        'USO_CONSOLIDADO': area_consolidada_gdf,
+        'USO_RESTRITO': uso_restrito_gdf,
+        'HIDROGRAFIA': hidrografia_gdf,
+        'SERVIDAO_ADMINISTRATIVA': servidao_gdf,
+    }
+    if layers:
+        camadas.update(layers)
+
+    if camadas['AREA_IMOVEL'] is None:
+        raise ValueError("Camada AREA_IMOVEL (perímetro) é obrigatória")
+
     builder = SICARShapefileBuilder(output_name, output_base=output_base)
 
-    # Nomes padronizados SICAR-SP
-    builder.add_layer('AREA_IMOVEL', perimetro_gdf)
-    builder.add_layer('APP', app_gdf)
-    builder.add_layer('RESERVA_LEGAL', reserva_legal_gdf)
-    builder.add_layer('VEGETACAO_NATIVA', vegetacao_nativa_gdf)
-    builder.add_layer('USO_CONSOLIDADO', area_consolidada_gdf)
-    builder.add_layer('USO_RESTRITO', uso_restrito_gdf)
-    builder.add_layer('HIDROGRAFIA', hidrografia_gdf)
-    builder.add_layer('SERVIDAO_ADMINISTRATIVA', servidao_gdf)
+    # Camadas não informadas (None) são puladas sem passar por add_layer
+    for name, gdf in camadas.items():
+        if gdf is not None:
+            builder.add_layer(name, gdf)
 
     return builder.build_zip()
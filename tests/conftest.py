@@ -0,0 +1,67 @@
+"""
+Fixtures compartilhadas pelos testes.
+"""
+import pytest
+from pathlib import Path
+
+FIXTURES_DIR = Path(__file__).parent / 'fixtures'
+
+
+@pytest.fixture(scope='session', autouse=True)
+def _warm_imports():
+    """
+    Importa as dependências pesadas (geopandas, pyproj, GDAL...) no início
+    da sessão, para que o custo não recaia sobre o primeiro teste.
+
+    Os imports dentro dos testes continuam; passam a ser só consultas a
+    sys.modules.
+    """
+    import geopandas  # noqa: F401
+    import pyproj  # noqa: F401
+    import shapely  # noqa: F401
+    try:
+        import pyogrio  # noqa: F401
+    except ImportError:
+        pass
+
+    from car_layers import app_calculator, reserva_legal  # noqa: F401
+    from data_sources import hydrology  # noqa: F401
+    from geospatial import kml_parser  # noqa: F401
+    from sicar_formatter import shapefile_builder  # noqa: F401
+
+
+@pytest.fixture(scope='session')
+def mursa_parsed():
+    """
+    Resultado de parse_kml do KML real Mursa, lido uma vez por sessão.
+
+    Com pytest-xdist cada worker tem sua própria sessão; o fixture só lê
+    o KML, então não há estado compartilhado entre processos.
+    """
+    from geospatial.kml_parser import parse_kml
+
+    return parse_kml(str(FIXTURES_DIR / 'mursa_real.kml'))
+
+
+@pytest.fixture
+def fast_tmpdir(tmp_path):
+    """
+    Diretório temporário para testes que gravam shapefiles.
+
+    Usa /dev/shm (tmpfs, sem fsync em disco) quando disponível, ou o
+    diretório indicado em TMPDIR_FAST; caso contrário, tmp_path do pytest.
+    """
+    import os
+    import shutil
+    import tempfile
+
+    base = os.environ.get('TMPDIR_FAST', '/dev/shm')
+    if not os.path.isdir(base) or not os.access(base, os.W_OK):
+        yield tmp_path
+        return
+
+    path = Path(tempfile.mkdtemp(prefix='autocar-', dir=base))
+    try:
+        yield path
+    finally:
+        shutil.rmtree(path, ignore_errors=True)
@@ -64,6 +64,33 @@ class TestAPPMargem:
         assert not app_gdf.empty
         assert any(app_gdf['buffer_m'] == 50)
 
+    def test_mixed_widths_get_their_own_buffer(self):
+        """Rios de larguras diferentes na mesma camada recebem faixas distintas."""
+        from car_layers.app_calculator import APPCalculator
+
+        polygon = Polygon([
+            (-46.83, -23.24),
+            (-46.81, -23.24),
+            (-46.81, -23.27),
+            (-46.83, -23.27),
+            (-46.83, -23.24)
+        ])
+
+        rivers = gpd.GeoDataFrame({
+            'geometry': [
+                LineString([(-46.825, -23.25), (-46.825, -23.26)]),
+                LineString([(-46.820, -23.25), (-46.820, -23.26)]),
+                LineString([(-46.815, -23.25), (-46.815, -23.26)])
+            ],
+            'largura_m': [5, 25, None]  # sem largura: padrão conservador
+        }, crs='EPSG:4326')
+
+        calc = APPCalculator(polygon)
+        app_gdf = calc.calculate_app_margem(rivers)
+
+        assert list(app_gdf['buffer_m']) == [30, 50, 30]
+        assert list(app_gdf['cod_app']) == ['APP_MARGEM_001', 'APP_MARGEM_002', 'APP_MARGEM_003']
+
     def test_app_only_inside_perimeter(self):
         """APP deve ser recortada ao perímetro do imóvel."""
         from car_layers.app_calculator import APPCalculator
@@ -90,7 +117,8 @@ class TestAPPMargem:
 
         if not app_gdf.empty:
             # APP deve estar contida no perímetro
-            app_union = app_gdf.unary_union
+            from shapely import unary_union
+            app_union = unary_union(app_gdf.geometry.to_numpy())
             assert polygon.contains(app_union) or polygon.intersects(app_union)
 
 
@@ -219,3 +247,36 @@ class TestAPPCalculatorIntegration:
         required_attrs = ['cod_app', 'tip_app', 'des_condic', 'num_area']
         for attr in required_attrs:
             assert attr in app_gdf.columns
+
+
+class TestAPPDeclividade:
+    """Testes para a máscara de declividade."""
+
+    def test_slope_mask_matches_numpy_gradient(self):
+        """Máscara de declividade deve coincidir com np.gradient."""
+        import numpy as np
+        from car_layers.app_calculator import _slope_mask, _slope_mask_numpy
+
+        rng = np.random.default_rng(0)
+        dem = rng.normal(0, 30, (40, 50)).cumsum(axis=0).astype(np.int16)
+
+        result = _slope_mask(dem, 30.0, 30.0, 45)
+        expected = _slope_mask_numpy(dem.astype(float), 30.0, 30.0, 45)
+
+        assert result.dtype == np.uint8
+        assert np.array_equal(result, expected)
+
+    def test_numexpr_slope_mask_matches_numpy(self):
+        """Caminho numexpr deve coincidir com o caminho NumPy."""
+        import numpy as np
+        pytest.importorskip('numexpr')
+        from car_layers.app_calculator import _slope_mask_numexpr, _slope_mask_numpy
+
+        rng = np.random.default_rng(1)
+        dem = rng.normal(0, 30, (40, 50)).cumsum(axis=0)
+
+        result = _slope_mask_numexpr(dem, 30.0, 30.0, 45)
+        expected = _slope_mask_numpy(dem, 30.0, 30.0, 45)
+
+        assert result.dtype == np.uint8
+        assert np.array_equal(result, expected)
@@ -31,13 +31,11 @@ class TestAreaCalculator:
         # Deve ser aproximadamente 100 ha (com margem de erro de 20%)
         assert 80 < area_ha < 120
 
-    def test_mursa_area_is_reasonable(self):
+    def test_mursa_area_is_reasonable(self, mursa_parsed):
         """A área do KML Mursa deve ser razoável para uma propriedade rural."""
-        from geospatial.kml_parser import parse_kml
         from geospatial.area_calculator import calculate_area_hectares
 
-        kml_path = FIXTURES_DIR / 'mursa_real.kml'
-        _, perimeter = parse_kml(str(kml_path))
+        _, perimeter = mursa_parsed
 
         area_ha = calculate_area_hectares(perimeter)
 
@@ -82,6 +80,32 @@ class TestAreaCalculator:
         # Deve funcionar mesmo com CRS diferente
         assert area_ha > 0
 
+    def test_calculate_areas_m2_matches_single(self):
+        """Cálculo em lote deve coincidir com o cálculo individual."""
+        from geospatial.area_calculator import calculate_area_m2, calculate_areas_m2
+
+        polygons = [
+            Polygon([
+                (-46.85, -23.20),
+                (-46.841, -23.20),
+                (-46.841, -23.209),
+                (-46.85, -23.209),
+                (-46.85, -23.20)
+            ]),
+            Polygon([
+                (-46.80, -23.25),
+                (-46.79, -23.25),
+                (-46.79, -23.26),
+                (-46.80, -23.25)
+            ])
+        ]
+
+        areas = calculate_areas_m2(polygons)
+
+        assert len(areas) == 2
+        for polygon, area in zip(polygons, areas):
+            assert area == pytest.approx(calculate_area_m2(polygon))
+
 
 class TestModuloFiscal:
     """Testes para cálculo de módulos fiscais."""
@@ -0,0 +1,43 @@
+"""
+Testes para o módulo _geo_utils.
+"""
+import numpy as np
+from shapely.geometry import MultiPolygon, Point, box
+
+
+class TestLargestPolygon:
+    """Testes para seleção do maior polígono."""
+
+    def test_largest_polygon_of_multipolygon(self):
+        """Deve retornar a parte de maior área do MultiPolygon."""
+        from geospatial._geo_utils import largest_polygon
+
+        multi = MultiPolygon([box(0, 0, 1, 1), box(5, 5, 8, 8), box(10, 10, 12, 12)])
+
+        assert largest_polygon(multi).equals(box(5, 5, 8, 8))
+
+    def test_other_geometries_are_returned_unchanged(self):
+        """Polygon e outras geometrias devem ser retornados como estão."""
+        from geospatial._geo_utils import largest_polygon
+
+        polygon = box(0, 0, 1, 1)
+        point = Point(0, 0)
+
+        assert largest_polygon(polygon) is polygon
+        assert largest_polygon(point) is point
+
+    def test_batch_matches_scalar(self):
+        """Versão em lote deve coincidir com a escalar, inclusive em empates."""
+        from geospatial._geo_utils import largest_polygon, largest_polygons
+
+        geoms = np.array([
+            MultiPolygon([box(0, 0, 1, 1), box(2, 0, 3, 1)]),  # empate
+            box(0, 0, 2, 2),
+            MultiPolygon([box(0, 0, 1, 1), box(5, 5, 9, 9)])
+        ], dtype=object)
+
+        result = largest_polygons(geoms)
+
+        for geom, largest in zip(geoms, result):
+            assert largest.equals_exact(largest_polygon(geom), 0)
+        assert isinstance(geoms[0], MultiPolygon)  # entrada não alterada
@@ -91,13 +91,11 @@ class TestGeometryValidator:
         assert len(result.exterior.coords) <= 1000
         assert any('simplificad' in e.lower() for e in errors)
 
-    def test_mursa_kml_passes_validation(self):
+    def test_mursa_kml_passes_validation(self, mursa_parsed):
         """O KML real Mursa deve passar na validação."""
-        from geospatial.kml_parser import parse_kml
         from geospatial.geometry_validator import GeometryValidator
 
-        kml_path = FIXTURES_DIR / 'mursa_real.kml'
-        _, perimeter = parse_kml(str(kml_path))
+        _, perimeter = mursa_parsed
 
         validator = GeometryValidator()
         result, errors = validator.validate(perimeter)
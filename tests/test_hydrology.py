@@ -13,13 +13,11 @@ FIXTURES_DIR = Path(__file__).parent / 'fixtures'
 class TestHydrologyCollector:
     """Testes para coleta de dados hidrográficos."""
 
-    def test_get_rivers_returns_geodataframe(self):
+    def test_get_rivers_returns_geodataframe(self, mursa_parsed):
         """Deve retornar GeoDataFrame com rios."""
         from data_sources.hydrology import HydrologyCollector
-        from geospatial.kml_parser import parse_kml
 
-        kml_path = FIXTURES_DIR / 'mursa_real.kml'
-        _, perimeter = parse_kml(str(kml_path))
+        _, perimeter = mursa_parsed
 
         collector = HydrologyCollector()
         rivers = collector.get_rivers_in_area(perimeter, buffer_km=2)
@@ -28,13 +26,11 @@ class TestHydrologyCollector:
         # Pode estar vazio se não houver dados locais
         assert 'geometry' in rivers.columns
 
-    def test_rivers_have_required_attributes(self):
+    def test_rivers_have_required_attributes(self, mursa_parsed):
         """Rios devem ter atributos necessários para APP."""
         from data_sources.hydrology import HydrologyCollector
-        from geospatial.kml_parser import parse_kml
 
-        kml_path = FIXTURES_DIR / 'mursa_real.kml'
-        _, perimeter = parse_kml(str(kml_path))
+        _, perimeter = mursa_parsed
 
         collector = HydrologyCollector()
         rivers = collector.get_rivers_in_area(perimeter, buffer_km=2)
@@ -43,13 +39,11 @@ class TestHydrologyCollector:
             # Deve ter largura para cálculo de APP
             assert 'largura_m' in rivers.columns or 'width' in rivers.columns
 
-    def test_get_lakes_returns_geodataframe(self):
+    def test_get_lakes_returns_geodataframe(self, mursa_parsed):
         """Deve retornar GeoDataFrame com lagos."""
         from data_sources.hydrology import HydrologyCollector
-        from geospatial.kml_parser import parse_kml
 
-        kml_path = FIXTURES_DIR / 'mursa_real.kml'
-        _, perimeter = parse_kml(str(kml_path))
+        _, perimeter = mursa_parsed
 
         collector = HydrologyCollector()
         lakes = collector.get_lakes_in_area(perimeter)
@@ -75,17 +69,174 @@ class TestHydrologyCollector:
 
         assert search_area.area > polygon.area
 
+    def test_search_buffer_is_cached(self):
+        """Mesmo polígono e buffer devem reutilizar a área de busca."""
+        from data_sources.hydrology import HydrologyCollector
+
+        polygon = Polygon([
+            (-46.85, -23.20),
+            (-46.84, -23.20),
+            (-46.84, -23.21),
+            (-46.85, -23.21),
+            (-46.85, -23.20)
+        ])
+
+        first = HydrologyCollector()._create_search_buffer(polygon, buffer_km=2)
+        second = HydrologyCollector()._create_search_buffer(
+            Polygon(polygon.exterior.coords), buffer_km=2
+        )
+        other = HydrologyCollector()._create_search_buffer(polygon, buffer_km=1)
+
+        assert second is first
+        assert other.area < first.area
+
+    def test_overpass_response_is_cached_on_disk(self, tmp_path, monkeypatch):
+        """Segunda consulta idêntica não deve acessar a rede."""
+        import requests
+        from data_sources import hydrology
+
+        calls = []
+
+        class FakeResponse:
+            content = b'{"elements": [{"type": "node", "id": 1, "lon": 0, "lat": 0}]}'
+
+            def raise_for_status(self):
+                pass
+
+        def fake_post(*args, **kwargs):
+            calls.append(kwargs)
+            return FakeResponse()
+
+        monkeypatch.setattr(requests.Session, 'post', fake_post)
+
+        query = '[out:json];node(1);out;'
+        first = hydrology.HydrologyCollector(osm_cache_dir=tmp_path)._query_overpass(query)
+        second = hydrology.HydrologyCollector(osm_cache_dir=tmp_path)._query_overpass(query)
+
+        assert len(calls) == 1
+        assert first == second
+
+    def test_overpass_cache_skips_partial_expired_and_unreadable(self, tmp_path, monkeypatch):
+        """Respostas com 'remark', expiradas ou ilegíveis devem gerar nova consulta."""
+        import os
+        import requests
+        from data_sources import hydrology
+
+        responses = [
+            b'{"remark": "runtime error: Query timed out", "elements": []}',
+            b'{"elements": [{"type": "node", "id": 1, "lon": 0, "lat": 0}]}',
+        ]
+        calls = []
+
+        class FakeResponse:
+            def __init__(self, content):
+                self.content = content
+
+            def raise_for_status(self):
+                pass
+
+        def fake_post(*args, **kwargs):
+            calls.append(kwargs)
+            return FakeResponse(responses[min(len(calls), len(responses)) - 1])
+
+        monkeypatch.setattr(requests.Session, 'post', fake_post)
+
+        query = '[out:json];node(1);out;'
+        key = hydrology.hashlib.sha1(query.encode('utf-8')).hexdigest()
+        cache_file = tmp_path / f'{key}.json'
+
+        # Resposta incompleta não é gravada
+        partial = hydrology.HydrologyCollector(osm_cache_dir=tmp_path)._query_overpass(query)
+        assert partial.get('remark')
+        assert not cache_file.exists()
+
+        hydrology.HydrologyCollector(osm_cache_dir=tmp_path)._query_overpass(query)
+        assert cache_file.exists()
+
+        # Cache expirado
+        old = cache_file.stat().st_mtime - hydrology.OSM_CACHE_TTL_S - 1
+        os.utime(cache_file, (old, old))
+        hydrology.HydrologyCollector(osm_cache_dir=tmp_path)._query_overpass(query)
+
+        # Cache corrompido
+        cache_file.write_bytes(b'{truncado')
+        data = hydrology.HydrologyCollector(osm_cache_dir=tmp_path)._query_overpass(query)
+
+        assert len(calls) == 4
+        assert data['elements']
+
+    def test_overpass_disk_cache_is_opt_in(self):
+        """Sem osm_cache_dir, nada é gravado em disco."""
+        from data_sources.hydrology import HydrologyCollector
+
+        assert HydrologyCollector().osm_cache_dir is None
+
+    def test_local_files_match_case_insensitively(self, tmp_path):
+        """Camadas com nome em maiúsculas/misto devem ser encontradas."""
+        from data_sources.hydrology import HydrologyCollector
+
+        area = Polygon([
+            (-46.85, -23.20),
+            (-46.84, -23.20),
+            (-46.84, -23.21),
+            (-46.85, -23.21),
+            (-46.85, -23.20)
+        ])
+        rivers = gpd.GeoDataFrame({
+            'nome': ['dentro'],
+            'geometry': [LineString([(-46.845, -23.205), (-46.835, -23.215)])]
+        }, crs='EPSG:4326')
+
+        # Diretório ainda inexistente: nada encontrado e nada em cache
+        data_dir = tmp_path / 'ibge'
+        assert HydrologyCollector(data_dir=data_dir)._load_local_rivers(area) is None
+
+        data_dir.mkdir()
+        rivers.to_file(data_dir / 'Hidrografia.shp')
+        loaded = HydrologyCollector(data_dir=data_dir)._load_local_rivers(area)
+
+        assert loaded is not None
+        assert list(loaded['nome']) == ['dentro']
+
+    def test_cached_layer_matches_uncached_read(self, tmp_path):
+        """Camada em cache deve retornar os mesmos rios da leitura direta."""
+        from data_sources.hydrology import HydrologyCollector
+
+        rivers = gpd.GeoDataFrame({
+            'nome': ['dentro', 'fora'],
+            'geometry': [
+                LineString([(-46.845, -23.205), (-46.835, -23.215)]),
+                LineString([(-46.70, -23.10), (-46.69, -23.11)])
+            ]
+        }, crs='EPSG:4326').to_crs('EPSG:31983')
+        rivers.to_file(tmp_path / 'rios.shp')
+
+        area = Polygon([
+            (-46.85, -23.20),
+            (-46.84, -23.20),
+            (-46.84, -23.21),
+            (-46.85, -23.21),
+            (-46.85, -23.20)
+        ])
+
+        direct = HydrologyCollector(data_dir=tmp_path)._load_local_rivers(area)
+        collector = HydrologyCollector(data_dir=tmp_path, cache_layers=True)
+        first = collector._load_local_rivers(area)
+        second = collector._load_local_rivers(area)
+
+        assert list(direct['nome']) == ['dentro']
+        assert list(first['nome']) == list(second['nome']) == ['dentro']
+        assert len(collector._layer_cache) == 1
+
 
 class TestNascenteIdentifier:
     """Testes para identificação de nascentes."""
 
-    def test_identify_nascentes_returns_geodataframe(self):
+    def test_identify_nascentes_returns_geodataframe(self, mursa_parsed):
         """Deve retornar GeoDataFrame com pontos de nascentes."""
         from data_sources.hydrology import NascenteIdentifier
-        from geospatial.kml_parser import parse_kml
 
-        kml_path = FIXTURES_DIR / 'mursa_real.kml'
-        _, perimeter = parse_kml(str(kml_path))
+        _, perimeter = mursa_parsed
 
         identifier = NascenteIdentifier()
 
@@ -128,3 +279,58 @@ class TestNascenteIdentifier:
         if not nascentes.empty:
             for geom in nascentes.geometry:
                 assert isinstance(geom, Point)
+
+    def test_remove_nearby_duplicates(self):
+        """Pontos a menos de 50m de uma nascente mantida devem ser removidos."""
+        from data_sources.hydrology import NascenteIdentifier
+
+        identifier = NascenteIdentifier()
+
+        # ~0.0003 grau ≈ 30m; ~0.001 grau ≈ 100m
+        points = gpd.GeoDataFrame({
+            'geometry': [
+                Point(-46.8200, -23.2500),
+                Point(-46.8197, -23.2500),
+                Point(-46.8190, -23.2500),
+                Point(-46.8187, -23.2500)
+            ],
+            'tipo': ['NASCENTE_IDENTIFICADA'] * 4
+        }, crs='EPSG:4326')
+
+        result = identifier._remove_nearby_duplicates(points, tolerance_m=50)
+
+        assert len(result) == 2
+        assert result.geometry.iloc[0].equals(points.geometry.iloc[0])
+        assert result.geometry.iloc[1].equals(points.geometry.iloc[2])
+
+    def test_exclude_starts_on_other_river(self):
+        """Início de trecho sobre outro rio não deve virar nascente se pedido."""
+        from data_sources.hydrology import NascenteIdentifier
+
+        identifier = NascenteIdentifier()
+
+        # Segundo trecho começa no fim do primeiro (way do OSM dividida)
+        rivers = gpd.GeoDataFrame({
+            'geometry': [
+                LineString([(-46.825, -23.250), (-46.820, -23.255)]),
+                LineString([(-46.820, -23.255), (-46.815, -23.260)])
+            ],
+            'largura_m': [5, 5]
+        }, crs='EPSG:4326')
+
+        polygon = Polygon([
+            (-46.83, -23.24),
+            (-46.81, -23.24),
+            (-46.81, -23.27),
+            (-46.83, -23.27),
+            (-46.83, -23.24)
+        ])
+
+        todas = identifier.identify_from_rivers(polygon, rivers)
+        filtradas = identifier.identify_from_rivers(
+            polygon, rivers, exclude_on_river_m=1
+        )
+
+        assert len(todas) == 2
+        assert len(filtradas) == 1
+        assert filtradas.geometry.iloc[0].equals(Point(-46.825, -23.250))
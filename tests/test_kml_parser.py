@@ -13,57 +13,46 @@ FIXTURES_DIR = Path(__file__).parent / 'fixtures'
 class TestParseKml:
     """Testes para a função parse_kml."""
 
-    def test_parse_valid_kml_returns_geodataframe_and_polygon(self):
+    def test_parse_valid_kml_returns_geodataframe_and_polygon(self, mursa_parsed):
         """Deve retornar GeoDataFrame e Polygon para KML válido."""
-        from geospatial.kml_parser import parse_kml
-
-        kml_path = FIXTURES_DIR / 'mursa_real.kml'
-        gdf, perimeter = parse_kml(str(kml_path))
+        gdf, perimeter = mursa_parsed
 
         assert gdf is not None
         assert not gdf.empty
         assert isinstance(perimeter, Polygon)
 
-    def test_parse_kml_extracts_correct_crs(self):
+    def test_parse_kml_extracts_correct_crs(self, mursa_parsed):
         """Deve extrair coordenadas em WGS84 (EPSG:4326)."""
-        from geospatial.kml_parser import parse_kml
-
-        kml_path = FIXTURES_DIR / 'mursa_real.kml'
-        gdf, _ = parse_kml(str(kml_path))
+        gdf, _ = mursa_parsed
 
         assert gdf.crs is not None
         assert gdf.crs.to_epsg() == 4326
 
-    def test_parse_kml_perimeter_is_valid_geometry(self):
+    def test_parse_kml_perimeter_is_valid_geometry(self, mursa_parsed):
         """O perímetro extraído deve ser uma geometria válida."""
-        from geospatial.kml_parser import parse_kml
-
-        kml_path = FIXTURES_DIR / 'mursa_real.kml'
-        _, perimeter = parse_kml(str(kml_path))
+        _, perimeter = mursa_parsed
 
         assert perimeter.is_valid
         assert not perimeter.is_empty
 
-    def test_parse_kml_perimeter_is_closed(self):
+    def test_parse_kml_perimeter_is_closed(self, mursa_parsed):
         """O perímetro deve ser um polígono fechado."""
-        from geospatial.kml_parser import parse_kml
+        import numpy as np
 
-        kml_path = FIXTURES_DIR / 'mursa_real.kml'
-        _, perimeter = parse_kml(str(kml_path))
+        _, perimeter = mursa_parsed
 
         # Um polígono fechado tem primeiro e último ponto iguais
-        coords = list(perimeter.exterior.coords)
-        assert coords[0] == coords[-1]
+        coords = np.asarray(perimeter.exterior.coords)
+        assert (coords[0] == coords[-1]).all()
 
-    def test_parse_kml_preserves_vertex_count(self):
+    def test_parse_kml_preserves_vertex_count(self, mursa_parsed):
         """Deve preservar o número de vértices do KML original."""
-        from geospatial.kml_parser import parse_kml
+        import numpy as np
 
-        kml_path = FIXTURES_DIR / 'mursa_real.kml'
-        _, perimeter = parse_kml(str(kml_path))
+        _, perimeter = mursa_parsed
 
         # O KML Mursa tem 14 coordenadas (13 vértices + fechamento)
-        coords = list(perimeter.exterior.coords)
+        coords = np.asarray(perimeter.exterior.coords)
         assert len(coords) == 14
 
     def test_parse_empty_kml_raises_error(self):
@@ -91,24 +80,102 @@ class TestParseKml:
         with pytest.raises(Exception):
             parse_kml('/path/to/nonexistent.kml')
 
+    def test_parse_cache_reuses_result_until_file_changes(self, tmp_path):
+        """Cache em disco deve ser reaproveitado e invalidado ao mudar o KML."""
+        import os
+        import shutil
+        from geospatial import kml_parser
+
+        kml_path = tmp_path / 'mursa.kml'
+        shutil.copy(FIXTURES_DIR / 'mursa_real.kml', kml_path)
+        cache_dir = tmp_path / 'cache'
+
+        kml_parser.set_parse_cache_dir(cache_dir)
+        try:
+            _, perimeter = kml_parser.parse_kml(str(kml_path))
+            assert len(list(cache_dir.glob('*.pkl'))) == 1
+
+            _, cached = kml_parser.parse_kml(str(kml_path))
+            assert cached.equals_exact(perimeter, 0)
+            assert len(list(cache_dir.glob('*.pkl'))) == 1
+
+            # Novo mtime gera nova entrada
+            stat = kml_path.stat()
+            os.utime(kml_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+            kml_parser.parse_kml(str(kml_path))
+            assert len(list(cache_dir.glob('*.pkl'))) == 2
+        finally:
+            kml_parser.set_parse_cache_dir(None)
+
+    def test_unwritable_parse_cache_does_not_break_parse(self, tmp_path):
+        """Falha ao gravar o cache não deve impedir a leitura do KML."""
+        from geospatial import kml_parser
+
+        # Diretório de cache "dentro" de um arquivo: mkdir falha com OSError
+        blocker = tmp_path / 'arquivo'
+        blocker.write_bytes(b'')
+
+        kml_parser.set_parse_cache_dir(blocker / 'cache')
+        try:
+            _, perimeter = kml_parser.parse_kml(str(FIXTURES_DIR / 'mursa_real.kml'))
+        finally:
+            kml_parser.set_parse_cache_dir(None)
+
+        assert perimeter.is_valid
+
 
 class TestCoordinatePrecision:
     """Testes para validação de precisão de coordenadas."""
 
-    def test_mursa_coordinates_have_sufficient_precision(self):
+    def test_mursa_coordinates_have_sufficient_precision(self, mursa_parsed):
         """As coordenadas do KML Mursa devem ter precisão suficiente."""
-        from geospatial.kml_parser import parse_kml
-
-        kml_path = FIXTURES_DIR / 'mursa_real.kml'
-        _, perimeter = parse_kml(str(kml_path))
-
-        coords = list(perimeter.exterior.coords)
-        for lon, lat in coords:
-            # Verificar pelo menos 8 casas decimais
-            lon_str = str(lon)
-            lat_str = str(lat)
-
-            if '.' in lon_str:
-                assert len(lon_str.split('.')[-1]) >= 8
-            if '.' in lat_str:
-                assert len(lat_str.split('.')[-1]) >= 8
+        import numpy as np
+
+        _, perimeter = mursa_parsed
+
+        # Apenas lon/lat; a coordenada Z (altitude) não entra na verificação
+        coords = np.asarray(perimeter.exterior.coords)[:, :2]
+        coord_strs = coords.astype(str)
+
+        # Verificar pelo menos 8 casas decimais onde houver parte decimal
+        has_decimal = np.char.find(coord_strs, '.') >= 0
+        decimals = np.char.partition(coord_strs, '.')[..., 2]
+        assert np.all(~has_decimal | (np.char.str_len(decimals) >= 8))
+
+    def test_validate_coordinate_precision_flags_only_low_precision_vertices(self):
+        """Somente vértices com poucas casas decimais devem gerar warning."""
+        from geospatial.kml_parser import validate_coordinate_precision
+
+        polygon = Polygon([
+            (-46.85, -23.20, 0),
+            (-46.841234567, -23.212345678, 0),
+            (-46.851234567, -23.212345678, 0)
+        ])
+
+        warnings = validate_coordinate_precision(polygon, min_decimals=8)
+
+        # Vértice 0 e fechamento (3) têm só 2 casas decimais
+        assert len(warnings) == 2
+        assert warnings[0].startswith('Vértice 0:')
+        assert warnings[1].startswith('Vértice 3:')
+
+    def test_jit_count_decimals_matches_str_count(self):
+        """Kernel Numba deve concordar com a contagem via str() até o limite."""
+        pytest.importorskip('numba')
+        import numpy as np
+        from geospatial._jit import count_decimals
+        from geospatial.kml_parser import _count_decimals
+
+        values = np.array([
+            [-46.85, -23.2],
+            [-46.841234567, -23.212345678],
+            [123.0, 0.0],
+            [0.1 + 0.2, 1e-05]
+        ])
+
+        result = count_decimals(values, 8)
+
+        for value, count in zip(values.ravel(), result.ravel()):
+            if count >= 0:
+                assert count == min(_count_decimals(value), 8)
+        assert result[3, 1] == -1  # notação científica fica para str()
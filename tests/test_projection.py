@@ -0,0 +1,56 @@
+"""
+Testes para o módulo projection.
+"""
+import pytest
+import numpy as np
+from shapely.geometry import Polygon, Point
+import geopandas as gpd
+
+
+class TestProjection:
+    """Testes para reprojeção com Transformer em cache."""
+
+    def test_transformer_is_cached(self):
+        """Mesmo par de CRS deve reutilizar o mesmo Transformer."""
+        from geospatial.projection import get_transformer
+
+        t1 = get_transformer('EPSG:4326', 'EPSG:31983')
+        t2 = get_transformer('EPSG:4326', 'EPSG:31983')
+
+        assert t1 is t2
+
+    def test_matches_geopandas_to_crs(self):
+        """Reprojeção deve coincidir com GeoDataFrame.to_crs."""
+        from geospatial.projection import transform_geometry
+
+        polygon = Polygon([
+            (-46.85, -23.20),
+            (-46.84, -23.20),
+            (-46.84, -23.21),
+            (-46.85, -23.21),
+            (-46.85, -23.20)
+        ])
+
+        expected = gpd.GeoSeries([polygon], crs='EPSG:4326').to_crs('EPSG:31983').iloc[0]
+        result = transform_geometry(polygon, 'EPSG:4326', 'EPSG:31983')
+
+        assert result.equals_exact(expected, 1e-6)
+
+    def test_array_preserves_z(self):
+        """Arrays devem ser reprojetados mantendo a coordenada Z."""
+        from geospatial.projection import transform_geometry
+
+        points = np.array([Point(-46.85, -23.20), Point(-46.84, -23.21, 700)])
+        result = transform_geometry(points, 'EPSG:4326', 'EPSG:31983')
+
+        assert len(result) == 2
+        assert not result[0].has_z
+        assert result[1].has_z and result[1].z == 700
+
+    def test_same_crs_returns_input(self):
+        """Mesmo CRS de origem e destino não deve reprojetar."""
+        from geospatial.projection import transform_geometry
+
+        point = Point(-46.85, -23.20)
+
+        assert transform_geometry(point, 'EPSG:4326', 'EPSG:4326') is point
@@ -7,110 +7,146 @@ from pathlib import Path
 from shapely.geometry import Polygon
 import geopandas as gpd
 import zipfile
-import tempfile
 import shutil
 
 FIXTURES_DIR = Path(__file__).parent / 'fixtures'
 
+# Perímetro de teste em WGS84, construído uma vez; cada teste fatia a
+# linha de que precisa (.iloc devolve um GeoDataFrame novo)
+_FIXTURE_GDF = gpd.GeoDataFrame({
+    'geometry': [Polygon([
+        (-46.85, -23.20),
+        (-46.84, -23.20),
+        (-46.84, -23.21),
+        (-46.85, -23.21),
+        (-46.85, -23.20)
+    ])],
+    'nome': ['Teste']
+}, crs='EPSG:4326')
+
 
 class TestShapefileBuilder:
     """Testes para geração de Shapefiles SICAR."""
 
-    def test_creates_output_directory(self):
+    def test_creates_output_directory(self, fast_tmpdir):
         """Deve criar diretório de saída."""
         from sicar_formatter.shapefile_builder import SICARShapefileBuilder
 
-        with tempfile.TemporaryDirectory() as tmpdir:
-            builder = SICARShapefileBuilder('teste', output_base=tmpdir)
+        builder = SICARShapefileBuilder('teste', output_base=fast_tmpdir)
 
-            assert builder.output_dir.exists()
+        assert builder.output_dir.exists()
 
     def test_adds_layer_successfully(self):
         """Deve adicionar camada ao builder."""
         from sicar_formatter.shapefile_builder import SICARShapefileBuilder
 
-        polygon = Polygon([
-            (-46.85, -23.20),
-            (-46.84, -23.20),
-            (-46.84, -23.21),
-            (-46.85, -23.21),
-            (-46.85, -23.20)
-        ])
+        gdf = _FIXTURE_GDF.iloc[[0]]
+
+        # add_layer não grava nada; o diretório de saída nem é criado
+        builder = SICARShapefileBuilder('teste')
+        builder.add_layer('perimetro', gdf)
+
+        assert 'perimetro' in builder.layers
+        assert not builder._output_dir_ready
+
+    def test_clip_bbox_keeps_only_intersecting_features(self, fast_tmpdir):
+        """clip_bbox deve manter só as feições que tocam o retângulo."""
+        from sicar_formatter.shapefile_builder import SICARShapefileBuilder
+        from shapely.geometry import LineString
 
         gdf = gpd.GeoDataFrame({
-            'geometry': [polygon],
-            'nome': ['Teste']
+            'geometry': [
+                LineString([(-46.90, -23.30), (-46.89, -23.31)]),
+                LineString([(-46.845, -23.20), (-46.845, -23.21)]),
+                LineString([(-46.80, -23.10), (-46.79, -23.11)])
+            ],
+            'nome': ['longe', 'dentro', 'longe']
         }, crs='EPSG:4326')
 
-        with tempfile.TemporaryDirectory() as tmpdir:
-            builder = SICARShapefileBuilder('teste', output_base=tmpdir)
-            builder.add_layer('perimetro', gdf)
+        builder = SICARShapefileBuilder('teste', output_base=fast_tmpdir)
+        builder.add_layer('hidrografia', gdf, clip_bbox=(-46.85, -23.21, -46.84, -23.20))
+        builder.add_layer('vazia', gdf, clip_bbox=(0, 0, 1, 1))
 
-            assert 'perimetro' in builder.layers
+        assert list(builder.layers['hidrografia']['nome']) == ['dentro']
+        assert 'vazia' not in builder.layers
 
-    def test_builds_shapefile_with_all_components(self):
+    def test_builds_shapefile_with_all_components(self, fast_tmpdir):
         """Shapefile deve ter todos os componentes (.shp, .shx, .dbf, .prj)."""
         from sicar_formatter.shapefile_builder import SICARShapefileBuilder
 
-        polygon = Polygon([
-            (-46.85, -23.20),
-            (-46.84, -23.20),
-            (-46.84, -23.21),
-            (-46.85, -23.21),
-            (-46.85, -23.20)
-        ])
+        gdf = _FIXTURE_GDF.iloc[[0]]
 
-        gdf = gpd.GeoDataFrame({
-            'geometry': [polygon],
-            'nome': ['Teste']
-        }, crs='EPSG:4326')
+        builder = SICARShapefileBuilder('teste', output_base=fast_tmpdir)
+        builder.add_layer('perimetro', gdf)
+        paths = builder.build_shapefiles()
 
-        with tempfile.TemporaryDirectory() as tmpdir:
-            builder = SICARShapefileBuilder('teste', output_base=tmpdir)
-            builder.add_layer('perimetro', gdf)
-            paths = builder.build_shapefiles()
+        shp_path = Path(paths['perimetro'])
+        assert shp_path.exists()
+        assert shp_path.with_suffix('.shx').exists()
+        assert shp_path.with_suffix('.dbf').exists()
+        assert shp_path.with_suffix('.prj').exists()
 
-            shp_path = Path(paths['perimetro'])
-            assert shp_path.exists()
-            assert shp_path.with_suffix('.shx').exists()
-            assert shp_path.with_suffix('.dbf').exists()
-            assert shp_path.with_suffix('.prj').exists()
+    def test_flatgeobuf_driver_writes_single_file(self, fast_tmpdir):
+        """Com driver FlatGeobuf cada camada deve virar um único .fgb."""
+        from sicar_formatter.shapefile_builder import SICARShapefileBuilder
 
-    def test_builds_valid_zip(self):
+        gdf = _FIXTURE_GDF.iloc[[0]]
+
+        builder = SICARShapefileBuilder(
+            'teste', output_base=fast_tmpdir, driver='FlatGeobuf'
+        )
+        builder.add_layer('perimetro', gdf)
+        paths = builder.build_shapefiles()
+
+        assert Path(paths['perimetro']).suffix == '.fgb'
+        assert [p.name for p in builder.output_dir.iterdir()] == ['perimetro.fgb']
+
+        with pytest.raises(ValueError):
+            SICARShapefileBuilder('teste', output_base=fast_tmpdir, driver='GPKG')
+
+    def test_builds_valid_zip(self, fast_tmpdir):
         """Deve gerar ZIP válido com todos os shapefiles."""
         from sicar_formatter.shapefile_builder import SICARShapefileBuilder
 
-        polygon = Polygon([
-            (-46.85, -23.20),
-            (-46.84, -23.20),
-            (-46.84, -23.21),
-            (-46.85, -23.21),
-            (-46.85, -23.20)
-        ])
+        gdf = _FIXTURE_GDF.iloc[[0]]
 
-        gdf = gpd.GeoDataFrame({
-            'geometry': [polygon],
-            'nome': ['Teste']
-        }, crs='EPSG:4326')
+        builder = SICARShapefileBuilder('teste', output_base=fast_tmpdir)
+        builder.add_layer('perimetro', gdf)
+        zip_path = builder.build_zip(compression=zipfile.ZIP_STORED)
 
-        with tempfile.TemporaryDirectory() as tmpdir:
-            builder = SICARShapefileBuilder('teste', output_base=tmpdir)
-            builder.add_layer('perimetro', gdf)
-            zip_path = builder.build_zip()
+        assert Path(zip_path).exists()
 
-            assert Path(zip_path).exists()
+        # Verificar conteúdo do ZIP
+        with zipfile.ZipFile(zip_path, 'r') as zf:
+            names = zf.namelist()
+            extensions = {Path(n).suffix for n in names}
 
-            # Verificar conteúdo do ZIP
-            with zipfile.ZipFile(zip_path, 'r') as zf:
-                names = zf.namelist()
-                extensions = {Path(n).suffix for n in names}
+            assert '.shp' in extensions
+            assert '.shx' in extensions
+            assert '.dbf' in extensions
+            assert '.prj' in extensions
+            assert all(
+                info.compress_type == zipfile.ZIP_STORED for info in zf.infolist()
+            )
 
-                assert '.shp' in extensions
-                assert '.shx' in extensions
-                assert '.dbf' in extensions
-                assert '.prj' in extensions
+    def test_zip_ignores_stale_files(self, fast_tmpdir):
+        """ZIP deve conter só as camadas atuais, não sobras de execuções anteriores."""
+        from sicar_formatter.shapefile_builder import SICARShapefileBuilder
 
-    def test_shapefiles_in_wgs84(self):
+        gdf = _FIXTURE_GDF.iloc[[0]]
+
+        builder = SICARShapefileBuilder('teste', output_base=fast_tmpdir)
+        (builder.output_dir / 'ANTIGA.shp').write_bytes(b'')
+        builder.add_layer('perimetro', gdf)
+        zip_path = builder.build_zip()
+
+        with zipfile.ZipFile(zip_path, 'r') as zf:
+            names = zf.namelist()
+
+        assert 'perimetro.shp' in names
+        assert 'ANTIGA.shp' not in names
+
+    def test_shapefiles_in_wgs84(self, fast_tmpdir):
         """Shapefiles devem estar em WGS84 (EPSG:4326)."""
         from sicar_formatter.shapefile_builder import SICARShapefileBuilder
 
@@ -128,20 +164,22 @@ class TestShapefileBuilder:
             'nome': ['Teste']
         }, crs='EPSG:31983')  # UTM
 
-        with tempfile.TemporaryDirectory() as tmpdir:
-            builder = SICARShapefileBuilder('teste', output_base=tmpdir)
-            builder.add_layer('perimetro', gdf)
-            paths = builder.build_shapefiles()
+        builder = SICARShapefileBuilder('teste', output_base=fast_tmpdir)
+        builder.add_layer('perimetro', gdf)
+        paths = builder.build_shapefiles()
 
-            # Ler shapefile gerado
-            result = gpd.read_file(paths['perimetro'])
-            assert result.crs.to_epsg() == 4326
+        # Ler só os metadados do shapefile gerado (sem decodificar geometrias)
+        pyogrio = pytest.importorskip('pyogrio')
+        from pyproj import CRS
+
+        info = pyogrio.read_info(paths['perimetro'])
+        assert CRS.from_user_input(info['crs']).to_epsg() == 4326
 
 
 class TestSICARPackage:
     """Testes para geração de pacote SICAR completo."""
 
-    def test_build_complete_package(self):
+    def test_build_complete_package(self, fast_tmpdir):
         """Deve gerar pacote completo com todas as camadas."""
         from sicar_formatter.shapefile_builder import build_sicar_package
 
@@ -171,24 +209,55 @@ class TestSICARPackage:
             'tip_app': ['MARGEM_CURSO_DAGUA']
         }, crs='EPSG:4326')
 
-        with tempfile.TemporaryDirectory() as tmpdir:
-            zip_path = build_sicar_package(
-                output_name='teste',
-                perimetro_gdf=perimetro_gdf,
-                app_gdf=app_gdf,
-                output_base=tmpdir
-            )
+        zip_path = build_sicar_package(
+            output_name='teste',
+            perimetro_gdf=perimetro_gdf,
+            app_gdf=app_gdf,
+            output_base=fast_tmpdir
+        )
+
+        assert Path(zip_path).exists()
+
+        # Verificar que tem múltiplas camadas
+        with zipfile.ZipFile(zip_path, 'r') as zf:
+            names = zf.namelist()
+            # Deve ter arquivos de perimetro e app
+            assert any('perimetro' in n for n in names)
+            assert any('app' in n for n in names)
+
+    def test_build_package_from_layers_dict(self, fast_tmpdir):
+        """Camadas podem ser passadas por dict, inclusive o perímetro."""
+        from sicar_formatter.shapefile_builder import build_sicar_package
+
+        perimetro = Polygon([
+            (-46.85, -23.20),
+            (-46.84, -23.20),
+            (-46.84, -23.21),
+            (-46.85, -23.21),
+            (-46.85, -23.20)
+        ])
+
+        perimetro_gdf = gpd.GeoDataFrame({
+            'geometry': [perimetro],
+            'nom_imovel': ['Fazenda Teste']
+        }, crs='EPSG:4326')
+
+        zip_path = build_sicar_package(
+            output_name='teste',
+            layers={'AREA_IMOVEL': perimetro_gdf, 'APP': None},
+            output_base=fast_tmpdir
+        )
+
+        with zipfile.ZipFile(zip_path, 'r') as zf:
+            names = zf.namelist()
 
-            assert Path(zip_path).exists()
+        assert 'AREA_IMOVEL.shp' in names
+        assert not any(n.startswith('APP.') for n in names)
 
-            # Verificar que tem múltiplas camadas
-            with zipfile.ZipFile(zip_path, 'r') as zf:
-                names = zf.namelist()
-                # Deve ter arquivos de perimetro e app
-                assert any('perimetro' in n for n in names)
-                assert any('app' in n for n in names)
+        with pytest.raises(ValueError):
+            build_sicar_package(output_name='teste', output_base=fast_tmpdir)
 
-    def test_ensures_sicar_attributes(self):
+    def test_ensures_sicar_attributes(self, fast_tmpdir):
         """Deve garantir atributos obrigatórios do SICAR."""
         from sicar_formatter.shapefile_builder import SICARShapefileBuilder
 
@@ -205,13 +274,16 @@ class TestSICARPackage:
             'geometry': [polygon]
         }, crs='EPSG:4326')
 
-        with tempfile.TemporaryDirectory() as tmpdir:
-            builder = SICARShapefileBuilder('teste', output_base=tmpdir)
-            builder.add_layer('perimetro', gdf)
-            paths = builder.build_shapefiles()
+        # Só os campos importam aqui; FlatGeobuf grava um único arquivo
+        builder = SICARShapefileBuilder(
+            'teste', output_base=fast_tmpdir, driver='FlatGeobuf'
+        )
+        builder.add_layer('perimetro', gdf)
+        paths = builder.build_shapefiles()
 
-            # Ler shapefile e verificar atributos
-            result = gpd.read_file(paths['perimetro'])
+        # Ler só a lista de campos da camada gravada e verificar atributos
+        pyogrio = pytest.importorskip('pyogrio')
+        fields = list(pyogrio.read_info(paths['perimetro'])['fields'])
 
-            # Deve ter adicionado atributos obrigatórios
-            assert 'cod_imovel' in result.columns or 'nom_imovel' in result.columns
+        # Deve ter adicionado atributos obrigatórios
+        assert 'cod_imovel' in fields or 'nom_imovel' in fields